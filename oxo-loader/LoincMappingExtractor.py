@@ -10,6 +10,7 @@ parser = OptionParser()
 parser.add_option("-t", "--terms", help="terms csv export file")
 parser.add_option("-m", "--mappings", help="mappings csv export file")
 parser.add_option("-c", "--config", help="config file", default="config.ini")
+parser.add_option("-b", "--bolt", action="store_true", dest="bolt", help="write terms and mappings directly to neo4j over bolt instead of csv files")
 
 (options, args) = parser.parse_args()
 
@@ -115,12 +116,18 @@ for row in loinc_mapping_reader:
 
     mappings.append(mapping)
 
-print("Generating CSV files for neo loading...")
-
-builder = OxoCsvBuilder.Builder()
-
-builder.exportTermsToCsv(exportFileTerms, terms)
-builder.exportMappingsToCsv(exportFileMappings, mappings, { 'LNC': loincDatasource })
+if options.bolt:
+    print("Writing terms and mappings to neo4j...")
+    import OxoBoltWriter
+    writer = OxoBoltWriter.fromConfig(config)
+    writer.writeTerms(OxoBoltWriter.termRows(terms))
+    writer.writeMappings(OxoBoltWriter.mappingRows(mappings, { 'LNC': loincDatasource }))
+else:
+    print("Generating CSV files for neo loading...")
+    builder = OxoCsvBuilder.Builder()
+
+    builder.exportTermsToCsv(exportFileTerms, terms)
+    builder.exportMappingsToCsv(exportFileMappings, mappings, { 'LNC': loincDatasource })
 
 print("Finished process!")
     
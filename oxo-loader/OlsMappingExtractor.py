@@ -19,6 +19,7 @@ parser = OptionParser()
 parser.add_option("-t", "--terms", help="terms csv export file")
 parser.add_option("-m", "--mappings", help="mappings csv export file")
 parser.add_option("-c", "--config", help="config file", default="config.ini")
+parser.add_option("-b", "--bolt", action="store_true", dest="bolt", help="write terms and mappings directly to neo4j over bolt instead of csv files")
 
 (options, args) = parser.parse_args()
 
@@ -280,13 +281,18 @@ for key, value in unknownSource.items() :
     # see if we can match prefix to db
     print(key.encode('utf-8', 'ignore'))
 
-print("Generating CSV files for neo loading...")
-
-
-import OxoCsvBuilder
-builder = OxoCsvBuilder.Builder()
-
-builder.exportTermsToCsv(exportFileTerms, terms)
-builder.exportMappingsToCsv(exportFileMappings, postMappings, prefixToDatasource)
+if options.bolt:
+    print("Writing terms and mappings to neo4j...")
+    import OxoBoltWriter
+    writer = OxoBoltWriter.fromConfig(config)
+    writer.writeTerms(OxoBoltWriter.termRows(terms))
+    writer.writeMappings(OxoBoltWriter.mappingRows(postMappings, prefixToDatasource))
+else:
+    print("Generating CSV files for neo loading...")
+    import OxoCsvBuilder
+    builder = OxoCsvBuilder.Builder()
+
+    builder.exportTermsToCsv(exportFileTerms, terms)
+    builder.exportMappingsToCsv(exportFileMappings, postMappings, prefixToDatasource)
 
 print("Finished process!")
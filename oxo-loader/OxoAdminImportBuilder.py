@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Converts the datasource, term and mapping CSV files of OxoCsvBuilder into the node and relationship files of
+neo4j-admin import, for a full rebuild of an empty OxO database without the transactional load of OxoNeo4jLoader.
+Terms and datasources use their curie and prefix as ID, so the IDs are the same in every rebuild. The result is the
+graph OxoNeo4jLoader would create: terms without a known datasource and mappings between unknown terms are dropped,
+every term and every HAS_SOURCE relationship is written once and with -D identical mappings are written once.
+"""
+__license__ = "Apache 2.0"
+__date__ = "18/10/2026"
+
+import csv
+import os
+from optparse import OptionParser
+
+# Array properties are split at this character by neo4j-admin import, prefixes contain commas
+arrayDelimiter = ";"
+
+
+def readCsv(file):
+    """Rows of a file written by OxoCsvBuilder"""
+    with open(file, newline='') as csvfile:
+        for row in csv.DictReader(csvfile, delimiter=',', escapechar='\\', doublequote=False):
+            yield row
+
+
+def writeCsv(file, header, rows):
+    with open(file, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',', quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+class AdminImportBuilder:
+    def __init__(self, targetFolder):
+        self.targetFolder = targetFolder
+        self.files = {"nodes": [], "relationships": []}
+
+    def path(self, name):
+        return os.path.join(self.targetFolder, name)
+
+    def buildDatasources(self, datasourceFiles):
+        """Datasource nodes with the properties set by OxoNeo4jLoader.loadDatasources, the last row of a prefix wins"""
+        datasources = {}
+        for file in datasourceFiles:
+            for line in readCsv(file):
+                datasources[line["prefix"]] = [line["prefix"], line["prefix"], line["title"], line["description"],
+                                               line["versionInfo"], line["idorgNamespace"], line["licence"], line["sourceType"],
+                                               arrayDelimiter.join(line["alternatePrefixes"].split(",")), "Datasource"]
+        header = ["prefix:ID(Datasource)", "preferredPrefix", "name", "description", "versionInfo", "idorgNamespace",
+                  "licence", "sourceType", "alternatePrefix:string[]", ":LABEL"]
+        count = writeCsv(self.path("datasources.csv"), header, (datasources[prefix] for prefix in sorted(datasources)))
+        self.files["nodes"].append("datasources.csv")
+        print("Wrote " + str(count) + " datasources")
+        return set(datasources)
+
+    def buildTerms(self, termFiles, prefixes):
+        """Term nodes and their HAS_SOURCE relationships, once per curie. Like the MERGE and SET of OxoNeo4jLoader.loadTerms
+        the last row of a curie wins, terms of an unknown datasource are dropped"""
+        terms = {}
+        dropped = 0
+        for file in termFiles:
+            for line in readCsv(file):
+                if line["prefix"] not in prefixes:
+                    dropped += 1
+                    continue
+                terms[line["curie"]] = line
+
+        count = writeCsv(self.path("terms.csv"), ["curie:ID(Term)", "id", "label", "uri", ":LABEL"],
+                         ([curie, terms[curie]["identifier"], terms[curie]["label"], terms[curie]["uri"], "Term"] for curie in sorted(terms)))
+        writeCsv(self.path("has_source.csv"), [":START_ID(Term)", ":END_ID(Datasource)", ":TYPE"],
+                 ([curie, terms[curie]["prefix"], "HAS_SOURCE"] for curie in sorted(terms)))
+        self.files["nodes"].append("terms.csv")
+        self.files["relationships"].append("has_source.csv")
+        print("Wrote " + str(count) + " terms, dropped " + str(dropped) + " rows of unknown datasources")
+        return set(terms)
+
+    def buildMappings(self, mappingFiles, curies, dedup=False):
+        """MAPPING relationships between known terms, in the order of the files. With dedup identical mappings are written once"""
+        stats = {"dropped": 0, "duplicates": 0}
+
+        def mappings():
+            seen = set()
+            for file in mappingFiles:
+                for line in readCsv(file):
+                    if line["fromCurie"] not in curies or line["toCurie"] not in curies:
+                        stats["dropped"] += 1
+                        continue
+                    row = (line["fromCurie"], line["toCurie"], line["datasourcePrefix"], line["datasource"],
+                           line["sourceType"], line["scope"], line["date"], "MAPPING")
+                    if dedup:
+                        if row in seen:
+                            stats["duplicates"] += 1
+                            continue
+                        seen.add(row)
+                    yield row
+
+        header = [":START_ID(Term)", ":END_ID(Term)", "sourcePrefix", "datasource", "sourceType", "scope", "date", ":TYPE"]
+        count = writeCsv(self.path("mappings.csv"), header, mappings())
+        self.files["relationships"].append("mappings.csv")
+        print("Wrote " + str(count) + " mappings, dropped " + str(stats["dropped"]) + " with unknown terms and " + str(stats["duplicates"]) + " duplicates")
+
+    def importCommand(self, database):
+        command = ["neo4j-admin import --mode=csv --database=" + database, "--delimiter=,", "--array-delimiter='" + arrayDelimiter + "'",
+                   "--quote='\"'", "--multiline-fields=true"]
+        command += ["--nodes=" + self.path(file) for file in self.files["nodes"]]
+        command += ["--relationships=" + self.path(file) for file in self.files["relationships"]]
+        return " \\\n    ".join(command)
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-d", "--datasources", action="append", default=[], help="datasource csv file, can be given more than once")
+    parser.add_option("-t", "--terms", action="append", default=[], help="term csv file, can be given more than once")
+    parser.add_option("-m", "--mappings", action="append", default=[], help="mapping csv file, can be given more than once")
+    parser.add_option("-o", "--output", help="folder for the neo4j-admin import files", default=".")
+    parser.add_option("-D", "--dedup", action="store_true", dest="dedup", help="write identical mappings only once")
+    parser.add_option("--database", help="name of the database created by neo4j-admin import", default="graph.db")
+
+    (options, args) = parser.parse_args()
+    if not options.datasources:
+        parser.error("At least one datasource file is needed, terms are only loaded for known datasources")
+
+    if not os.path.exists(options.output):
+        os.makedirs(options.output)
+
+    builder = AdminImportBuilder(options.output)
+    prefixes = builder.buildDatasources(options.datasources)
+    curies = builder.buildTerms(options.terms, prefixes)
+    builder.buildMappings(options.mappings, curies, options.dedup)
+
+    print("Stop neo4j, remove the old database and run:")
+    print(builder.importCommand(options.database))
+    print("Then start neo4j, OxoNeo4jLoader creates the constraints on Term.curie and Datasource.prefix on its next start")
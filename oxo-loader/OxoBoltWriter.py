@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""
+Writes OxO terms and mappings to neo4j over bolt, in parameterised UNWIND batches sent by a few parallel sessions.
+Unlike LOAD CSV, neo4j does not need to see the files, so the loader and the database do not have to share a filesystem.
+The writer takes any iterable of rows: the terms and mappings of the extractors directly, or the rows of their CSV files.
+"""
+__license__ = "Apache 2.0"
+__date__ = "18/10/2026"
+
+import csv
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from neo4j.v1 import GraphDatabase, basic_auth
+from neo4j import SessionExpired
+from neo4j.exceptions import TransientError, ServiceUnavailable, DatabaseUnavailableError
+
+# Same statements as the LOAD CSV of OxoNeo4jLoader, one row of the batch per line
+loadTermsCypher = """UNWIND $rows AS line
+                MATCH (d:Datasource {prefix : line.prefix})
+                WITH d, line
+                MERGE (t:Term { curie: line.curie})
+                SET t.id = line.identifier, t.label = line.label, t.uri = line.uri
+                with t,d
+                CREATE (t)-[:HAS_SOURCE]->(d)"""
+
+loadMappingsCypher = """UNWIND $rows AS line
+                MATCH (f:Term { curie: line.fromCurie}),(t:Term { curie: line.toCurie})
+                WITH f,t,line
+                CREATE (f)-[m:MAPPING { sourcePrefix: line.datasourcePrefix, datasource: line.datasource, sourceType: line.sourceType, scope: line.scope, date: line.date}]->(t)"""
+
+# MERGE instead of CREATE, a mapping with the same terms and properties as an existing one is not created again
+mergeMappingsCypher = loadMappingsCypher.replace("CREATE (f)-[m:MAPPING", "MERGE (f)-[m:MAPPING")
+
+# Failures after which a batch is sent again, e.g. deadlocks between the parallel sessions or a restarting database
+retryableErrors = (TransientError, ServiceUnavailable, SessionExpired, DatabaseUnavailableError)
+
+
+class BoltWriter:
+    def __init__(self, driver, batchSize=10000, writers=4, retries=5):
+        self.driver = driver
+        self.batchSize = batchSize
+        self.writers = writers
+        self.retries = retries
+
+    def writeTerms(self, rows):
+        return self.write(loadTermsCypher, rows, "terms")
+
+    def writeMappings(self, rows, dedup=False):
+        return self.write(mergeMappingsCypher if dedup else loadMappingsCypher, rows, "mappings")
+
+    def writeMappingsPartitioned(self, rows, partitions, dedup=False, folder=None):
+        """Splits the mappings into partitions x partitions buckets by the hash of their from and to term and loads them
+        in rounds, one session per partition. In round r the buckets (i, i+r) are loaded, so no two sessions of a round
+        create relationships from the same from terms or to the same to terms, which keeps the lock contention on the
+        term nodes low. Deadlocks that still happen (a term can be on both sides) are retried. Identical mappings land in the same bucket, so dedup needs no coordination between sessions.
+        The buckets are spilled to json line files in a temporary folder (in folder, if given)"""
+        cypher = mergeMappingsCypher if dedup else loadMappingsCypher
+        start = time.time()
+        written = 0
+        with tempfile.TemporaryDirectory(dir=folder) as bucketFolder:
+            buckets = splitMappings(rows, partitions, bucketFolder)
+            print("Split " + str(sum(buckets.values())) + " mappings into " + str(partitions * partitions) + " buckets in " + str(round(time.time() - start, 1)) + "s")
+            with ThreadPoolExecutor(max_workers=partitions) as executor:
+                for r in range(partitions):
+                    roundStart = time.time()
+                    futures = [executor.submit(self.writeBucket, cypher, bucketFolder, (i, (i + r) % partitions)) for i in range(partitions)]
+                    roundRows = sum(future.result() for future in futures)
+                    written += roundRows
+                    elapsed = time.time() - roundStart
+                    print("Round " + str(r + 1) + " of " + str(partitions) + ": " + str(roundRows) + " mappings in " + str(round(elapsed, 1)) + "s (" + str(int(roundRows / max(elapsed, 0.001))) + " rows/s)")
+
+        elapsed = time.time() - start
+        print("Wrote " + str(written) + " mappings in " + str(round(elapsed, 1)) + "s (" + str(int(written / max(elapsed, 0.001))) + " rows/s)")
+        return written
+
+    def writeBucket(self, cypher, bucketFolder, bucket):
+        written = 0
+        with open(bucketFile(bucketFolder, bucket)) as f:
+            for chunk, batch in enumerate(batches((json.loads(line) for line in f), self.batchSize)):
+                chunkStart = time.time()
+                written += self.writeBatch(cypher, batch)
+                elapsed = time.time() - chunkStart
+                print("Bucket " + str(bucket[0]) + "/" + str(bucket[1]) + " chunk " + str(chunk + 1) + ": " + str(len(batch)) + " mappings in " + str(round(elapsed, 2)) + "s (" + str(int(len(batch) / max(elapsed, 0.001))) + " rows/s)")
+        return written
+
+    def write(self, cypher, rows, name):
+        """Sends the rows in batches, at most two batches per writer are in flight. Returns the number of rows written"""
+        print("Writing " + name + " over bolt, " + str(self.batchSize) + " rows per batch, " + str(self.writers) + " writers")
+        start = time.time()
+        written = 0
+        with ThreadPoolExecutor(max_workers=self.writers) as executor:
+            pending = set()
+            for batch in batches(rows, self.batchSize):
+                if len(pending) >= 2 * self.writers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    written += sum(future.result() for future in done)
+                    self.progress(name, written, start)
+                pending.add(executor.submit(self.writeBatch, cypher, batch))
+            done, pending = wait(pending)
+            written += sum(future.result() for future in done)
+
+        elapsed = time.time() - start
+        print("Wrote " + str(written) + " " + name + " in " + str(round(elapsed, 1)) + "s (" + str(int(written / max(elapsed, 0.001))) + " rows/s)")
+        return written
+
+    def writeBatch(self, cypher, batch):
+        attempt = 0
+        while True:
+            try:
+                with self.driver.session() as session:
+                    session.write_transaction(lambda tx: tx.run(cypher, rows=batch).consume())
+                return len(batch)
+            except retryableErrors as e:
+                if attempt >= self.retries:
+                    print("Batch of " + str(len(batch)) + " rows failed " + str(attempt + 1) + " times, giving up")
+                    raise
+                delay = random.uniform(0, min(60, 2 ** attempt))
+                print("Batch failed (" + str(e) + "), try again after " + str(round(delay, 1)) + " seconds")
+                time.sleep(delay)
+                attempt += 1
+
+    def progress(self, name, written, start):
+        elapsed = time.time() - start
+        print(str(written) + " " + name + " written, " + str(int(written / max(elapsed, 0.001))) + " rows/s")
+
+
+def fromConfig(config):
+    """Writer for the neo4j of the Basics section, boltBatchSize and boltWriters are optional"""
+    driver = GraphDatabase.driver(config.get("Basics", "neoURL"), auth=basic_auth(config.get("Basics", "neoUser"), config.get("Basics", "neoPass")))
+    return BoltWriter(driver, batchSize=config.getint("Basics", "boltBatchSize", fallback=10000),
+                      writers=config.getint("Basics", "boltWriters", fallback=4))
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def partitionOf(curie, partitions):
+    return zlib.crc32((curie or "").encode("utf-8")) % partitions
+
+
+def bucketFile(bucketFolder, bucket):
+    return os.path.join(bucketFolder, "mappings_" + str(bucket[0]) + "_" + str(bucket[1]) + ".jsonl")
+
+
+def splitMappings(rows, partitions, bucketFolder):
+    """Writes every mapping to the bucket of its (from, to) partitions, returns the number of mappings per bucket"""
+    files = {}
+    counts = {}
+    for i in range(partitions):
+        for j in range(partitions):
+            files[(i, j)] = open(bucketFile(bucketFolder, (i, j)), "w")
+            counts[(i, j)] = 0
+    try:
+        for row in rows:
+            bucket = (partitionOf(row["fromCurie"], partitions), partitionOf(row["toCurie"], partitions))
+            files[bucket].write(json.dumps(row) + "\n")
+            counts[bucket] += 1
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+
+def termRows(terms):
+    """Rows of the terms of an extractor, like OxoCsvBuilder.exportTermsToCsv"""
+    for key, term in terms.items():
+        yield {"identifier": term["id"], "curie": term["curie"], "label": term["label"], "uri": term["uri"], "prefix": term["prefix"]}
+
+
+def mappingRows(postMappings, prefixToDatasource):
+    """Rows of the mappings of an extractor, like OxoCsvBuilder.exportMappingsToCsv"""
+    date = datetime.datetime.now().strftime("%y-%m-%d")
+    for mapping in postMappings:
+        datasource = prefixToDatasource[mapping["datasourcePrefix"]]
+        yield {"fromCurie": mapping["fromId"], "toCurie": mapping["toId"], "datasourcePrefix": mapping["datasourcePrefix"],
+               "datasource": json.dumps(datasource), "sourceType": mapping["sourceType"], "scope": mapping["scope"], "date": date}
+
+
+def csvRows(file):
+    """Rows of a terms or mappings file written by OxoCsvBuilder"""
+    with open(file, newline='') as csvfile:
+        for row in csv.DictReader(csvfile, delimiter=',', escapechar='\\', doublequote=False):
+            yield row
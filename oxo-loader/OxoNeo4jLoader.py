@@ -10,6 +10,7 @@ __date__ = "03/03/2018"
 from neo4j.v1 import GraphDatabase, basic_auth
 from configparser import ConfigParser
 from optparse import OptionParser
+import OxoBoltWriter
 
 class Neo4jOxOLoader:
     def __init__(self):
@@ -26,6 +27,10 @@ class Neo4jOxOLoader:
         parser.add_option("-m","--mappings", help="load the mapping file")
         parser.add_option("-W","--wipe", action="store_true", dest="wipe", help="wipe the neo4j database")
         parser.add_option("-c","--config", help="config file", default="config.ini")
+        parser.add_option("-b","--bolt", action="store_true", dest="bolt", help="send terms and mappings over bolt in UNWIND batches instead of LOAD CSV, the files are read by the loader")
+        parser.add_option("-p","--partitions", type="int", dest="partitions", help="load the mappings over bolt through this many parallel sessions, split into partitions x partitions buckets by from and to term")
+        parser.add_option("-T","--spill-folder", dest="spillFolder", help="folder for the mapping buckets of -p, default is boltSpillFolder of the config or the system temp folder")
+        parser.add_option("-D","--dedup", action="store_true", dest="dedup", help="MERGE mappings instead of CREATE, identical mappings are only loaded once")
 
         (options, args) = parser.parse_args()
 
@@ -44,6 +49,15 @@ class Neo4jOxOLoader:
         driver = GraphDatabase.driver(uri, auth=basic_auth(neoUser, neoPass))
         self.session = driver.session()
 
+        self.boltWriter = None
+        self.partitions = options.partitions
+        self.dedup = options.dedup
+        # An empty folder means the system temp folder
+        self.spillFolder = options.spillFolder or config.get("Basics", "boltSpillFolder", fallback=None) or None
+        if options.bolt or options.partitions:
+            self.boltWriter = OxoBoltWriter.BoltWriter(driver, batchSize=config.getint("Basics", "boltBatchSize", fallback=10000),
+                                                       writers=config.getint("Basics", "boltWriters", fallback=4))
+
         self.session.run("CREATE CONSTRAINT ON (i:Term) ASSERT i.curie IS UNIQUE")
         self.session.run("CREATE CONSTRAINT ON (i:Datasource) ASSERT i.prefix IS UNIQUE")
 
@@ -94,6 +108,9 @@ class Neo4jOxOLoader:
 
     def loadTerms(self, terms):
         print("Loading terms from "+terms+"...")
+        if self.boltWriter is not None:
+            self.boltWriter.writeTerms(OxoBoltWriter.csvRows(terms))
+            return
 
         loadTermsCypher = "USING PERIODIC COMMIT 10000 LOAD CSV WITH HEADERS FROM 'file:///"+terms+"""' AS line
                         MATCH (d:Datasource {prefix : line.prefix})
@@ -107,10 +124,17 @@ class Neo4jOxOLoader:
 
     def loadMappings(self, mappings):
         print("Loading mappings from "+mappings+"...")
+        if self.partitions:
+            self.boltWriter.writeMappingsPartitioned(OxoBoltWriter.csvRows(mappings), self.partitions, self.dedup, self.spillFolder)
+            return
+        if self.boltWriter is not None:
+            self.boltWriter.writeMappings(OxoBoltWriter.csvRows(mappings), self.dedup)
+            return
+        writeMapping = "MERGE" if self.dedup else "CREATE"
         loadMappingsCypher = "USING PERIODIC COMMIT 10000 LOAD CSV WITH HEADERS FROM 'file:///"+mappings+"""' AS line
                         MATCH (f:Term { curie: line.fromCurie}),(t:Term { curie: line.toCurie})
                         WITH f,t,line
-                        CREATE (f)-[m:MAPPING { sourcePrefix: line.datasourcePrefix, datasource: line.datasource, sourceType: line.sourceType, scope: line.scope, date: line.date}]->(t)"""
+                        """+writeMapping+""" (f)-[m:MAPPING { sourcePrefix: line.datasourcePrefix, datasource: line.datasource, sourceType: line.sourceType, scope: line.scope, date: line.date}]->(t)"""
 
         result = self.session.run(loadMappingsCypher)
         print(result.summary())
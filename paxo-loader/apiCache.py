@@ -0,0 +1,144 @@
+import sqlite3
+import hashlib
+import json
+import zlib
+import time
+import threading
+import logging
+
+#Response object returned for a cache hit, offers the parts of a requests response that paxo uses
+class CachedResponse:
+    def __init__(self, url, status_code, content):
+        self.url=url
+        self.status_code=status_code
+        self.content=content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+#Persistent on-disk cache for OLS and OxO api calls, stored in a SQLite file.
+#Entries are keyed on a hash of the url, the parameters and the version of the ontology that is queried.
+#Calls without an ontology (the relaxed search in all of OLS, the OxO mapping lookups) have no version and only expire through the ttl
+class ApiCache:
+    def __init__(self, cacheFile, ttl, maxSizeMB):
+        self.cacheFile=cacheFile
+        self.ttl=ttl
+        self.maxSize=maxSizeMB*1024*1024
+        self.hits=0
+        self.misses=0
+        self.puts=0
+        #Ontology name -> version string, set from the OLS ontology metadata
+        self.ontologyVersions={}
+
+        self.connect()
+
+    #Opens the SQLite file. WAL mode lets several processes use the same cache file
+    def connect(self):
+        self.lock=threading.Lock()
+        #Key -> time of the last hit, written in one batch instead of one write per hit
+        self.accessed={}
+        self.connection=sqlite3.connect(self.cacheFile, check_same_thread=False, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, status INTEGER, body BLOB, size INTEGER, created REAL, accessed REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.connection.commit()
+
+    #A forked worker process opens its own connection, SQLite connections must not be used across a fork.
+    #The statistics start from zero, so they cover the work of that process
+    def reopen(self):
+        self.hits=0
+        self.misses=0
+        self.puts=0
+        self.connect()
+
+    #Register the version of an ontology, taken from the 'updated' and 'versionIri' fields of the OLS metadata
+    def setOntologyVersion(self, ontology, updated, versionIri):
+        self.ontologyVersions[ontology]=str(updated)+"|"+str(versionIri)
+
+    #Content address of a call. If the call is restricted to an ontology with a known version, the version is part of the key.
+    #Other calls are keyed without a version, a new release of an ontology does not invalidate them
+    def key(self, url, data):
+        if data==None:
+            data={}
+        params=sorted((str(k), unicode(v).encode('utf-8') if isinstance(v, unicode) else str(v)) for k, v in data.items())
+        ontology=data.get("ontology", data.get("mappingTarget", None))
+        version=self.ontologyVersions.get(ontology, "")
+        return hashlib.sha1(json.dumps([url, params, version])).hexdigest()
+
+    def get(self, url, data):
+        key=self.key(url, data)
+        now=time.time()
+        with self.lock:
+            row=self.connection.execute("SELECT url, status, body, created FROM responses WHERE key=?", (key,)).fetchone()
+            if row==None:
+                self.misses=self.misses+1
+                return None
+            if self.ttl>0 and now-row[3]>self.ttl:
+                self.connection.execute("DELETE FROM responses WHERE key=?", (key,))
+                self.connection.commit()
+                self.misses=self.misses+1
+                return None
+            self.accessed[key]=now
+            self.hits=self.hits+1
+            if len(self.accessed)>=1000:
+                self.flushAccessed()
+        return CachedResponse(row[0], row[1], zlib.decompress(row[2]))
+
+    #Only successful replies are stored, so errors are retried with the next run
+    def put(self, url, data, response):
+        if response.status_code!=200:
+            return
+        key=self.key(url, data)
+        body=sqlite3.Binary(zlib.compress(response.content))
+        now=time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses (key, url, status, body, size, created, accessed) VALUES (?,?,?,?,?,?,?)", (key, response.url, response.status_code, body, len(body), now, now))
+            self.connection.commit()
+            self.puts=self.puts+1
+            if self.puts%1000==0:
+                self.flushAccessed()
+                self.evict()
+
+    #Writes the access times of the hits since the last flush, so the eviction sees them. Caller holds the lock
+    def flushAccessed(self):
+        if len(self.accessed)==0:
+            return
+        self.connection.executemany("UPDATE responses SET accessed=MAX(accessed,?) WHERE key=?", [(accessed, key) for key, accessed in self.accessed.items()])
+        self.connection.commit()
+        self.accessed={}
+
+    #Size based eviction, removes the least recently used entries until the cache is below maxSize. Caller holds the lock
+    def evict(self):
+        if self.maxSize<=0:
+            return
+        total=self.connection.execute("SELECT COALESCE(SUM(size),0) FROM responses").fetchone()[0]
+        if total<=self.maxSize:
+            return
+        excess=total-self.maxSize
+        keys=[]
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            keys.append((key,))
+            excess=excess-size
+            if excess<=0:
+                break
+        self.connection.executemany("DELETE FROM responses WHERE key=?", keys)
+        self.connection.commit()
+        logging.info("Evicted "+str(len(keys))+" entries from the api cache")
+
+    def stats(self):
+        total=self.hits+self.misses
+        hitRate=0.0
+        if total>0:
+            hitRate=round(self.hits*100.0/total, 2)
+        return "Api cache "+self.cacheFile+": "+str(self.hits)+" hits, "+str(self.misses)+" misses, hit rate "+str(hitRate)+"%"
+
+    def close(self):
+        with self.lock:
+            self.flushAccessed()
+            self.evict()
+            self.connection.close()
@@ -0,0 +1,247 @@
+#Micro-benchmarks for the CPU bound parts of paxo. Synthetic data, no webservice calls
+#Usage: python benchmark.py [stringMatcher] [primaryScore] [validation] [scoreSimple] [curation] [scoreFile]
+import sys
+import time
+import random
+import Levenshtein
+import paxo_internals
+import validation
+import scoreKernel
+import scoreFile
+
+words=["abnormal", "abnormality", "morphology", "of", "the", "heart", "liver", "kidney", "cancer", "carcinoma", "neoplasm",
+       "tumor", "decreased", "reduced", "increased", "size", "cell", "bone", "muscle", "disease", "cataract", "nuclear"]
+
+def randomLabel(rnd):
+    return ' '.join(rnd.choice(words) for i in range(rnd.randint(1, 5)))
+
+def timed(function, *args):
+    start=time.time()
+    result=function(*args)
+    return result, time.time()-start
+
+#Former implementation of paxo_internals.stringMatcher, the reference for the scores
+def legacyStringMatcher(sourceTerm, targetTerm, replaceTermList, removeStopwordsList):
+    lev=round(Levenshtein.ratio(sourceTerm, targetTerm), 5)
+    sourceTerm=paxo_internals.sortWords(sourceTerm)
+    targetTerm=paxo_internals.sortWords(targetTerm)
+    replacementLev=round(Levenshtein.ratio(sourceTerm, targetTerm), 5)
+    if replacementLev>lev:
+        lev=replacementLev
+    for stop in removeStopwordsList:
+        sourceTerm=sourceTerm.replace(stop,'').strip().replace('  ', ' ')
+        targetTerm=targetTerm.replace(stop, '').strip().replace('  ', ' ')
+    for replacement in replaceTermList:
+        tmpSource=paxo_internals.sortWords(sourceTerm.replace(replacement[0], replacement[1]))
+        replacementLev=round(Levenshtein.ratio(tmpSource, targetTerm), 5)
+        if replacementLev>lev:
+            lev=replacementLev
+    for replacement in replaceTermList:
+        tmpTarget=paxo_internals.sortWords(targetTerm.replace(replacement[0], replacement[1]))
+        replacementLev=round(Levenshtein.ratio(sourceTerm, tmpTarget), 5)
+        if replacementLev>lev:
+            lev=replacementLev
+    return lev
+
+def benchmarkStringMatcher(sources=200, candidates=500):
+    rnd=random.Random(42)
+    replaceTermList=[('cancer', 'carcinom'), ('cancer', 'neoplasm'), ('cancer','carcinoma'), ('abnormality','disease'), ('abnormal','Abnormality')]
+    removeStopwordsList=['of', 'the']
+    sourceLabels=[randomLabel(rnd) for i in range(sources)]
+    #Popular labels come back for many source labels, so the candidates repeat
+    pool=[randomLabel(rnd) for i in range(candidates/2)]
+    targetLabels=[rnd.choice(pool) for i in range(candidates)]
+
+    def legacy():
+        return [[legacyStringMatcher(s, t, replaceTermList, removeStopwordsList) for t in targetLabels] for s in sourceLabels]
+
+    def batch():
+        return [paxo_internals.stringMatcherBatch(s, targetLabels, replaceTermList, removeStopwordsList) for s in sourceLabels]
+
+    legacyScores, legacyTime=timed(legacy)
+    batchScores, batchTime=timed(batch)
+    print "stringMatcher, "+str(sources)+" source labels x "+str(candidates)+" candidates"
+    print "  legacy:  "+str(round(legacyTime, 3))+"s"
+    print "  batch:   "+str(round(batchTime, 3))+"s"
+    print "  speedup: "+str(round(legacyTime/batchTime, 2))+"x, identical scores: "+str(legacyScores==batchScores)
+
+#Former implementation of paxo.scoreOntologyPrimaryScore, one row per candidate and a quadratic duplicate check
+def legacySimplifyPrimaryScoreRows(rows):
+    scoreMatrix=[]
+    for originalLabel, orginaliri, fuzzy, oxo, synFuzzy, bridgeEvidence in rows:
+        for i in fuzzy+synFuzzy:
+            scoreMatrix.append({"sourceTerm":originalLabel, "sourceIRI":orginaliri ,"iri": i['fuzzyIri'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "bridgeEvidence":bridgeEvidence})
+        for i in oxo+bridgeEvidence:
+            scoreMatrix.append({"sourceTerm":originalLabel, "sourceIRI":orginaliri ,"iri": i['oxoCurie'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "bridgeEvidence":bridgeEvidence})
+    simplerMatrix=[]
+    for line in scoreMatrix:
+        pScore=paxo_internals.simplifyProcessedPscore(line)
+        if pScore not in simplerMatrix:
+            simplerMatrix.append(pScore)
+    return simplerMatrix
+
+#Rows in the form of the primary score with 10 candidates each, every 20th row repeats an earlier one
+def primaryScoreRows(rnd, candidateRows):
+    rows=[]
+    for i in range(candidateRows/10):
+        if i>0 and i%20==0:
+            rows.append(rows[rnd.randint(0, i-1)])
+            continue
+        iris=["http://purl.obolibrary.org/obo/BB_"+str(rnd.randint(0, 50000)) for j in range(6)]
+        fuzzy=[{"fuzzyIri": iri, "fuzzyMapping": randomLabel(rnd), "fuzzyScore": round(rnd.random(), 5)} for iri in iris[:5]]
+        oxo=[{"oxoCurie": iris[0], "oxoLabel": randomLabel(rnd), "distance": 1, "oxoScore": 1}, {"oxoCurie": "BB:"+str(i), "oxoLabel": randomLabel(rnd), "distance": 2, "oxoScore": 1}]
+        synFuzzy=[{"fuzzyIri": iri, "fuzzyMapping": randomLabel(rnd), "fuzzyScore": round(rnd.random(), 5)} for iri in iris[4:]]
+        bridge=[{"oxoCurie": iris[1], "distance": 1, "oxoScore": 1}]
+        rows.append((randomLabel(rnd), "http://purl.obolibrary.org/obo/AA_"+str(i), fuzzy, oxo, synFuzzy, bridge))
+    return rows
+
+def benchmarkPrimaryScore(sizes=(10000, 100000, 1000000), legacyLimit=20000):
+    print "scoreOntologyPrimaryScore, rows x 10 candidates"
+    for size in sizes:
+        rows=primaryScoreRows(random.Random(42), size)
+        result, newTime=timed(paxo_internals.simplifyPrimaryScoreRows, rows)
+        line="  "+str(size)+" candidate rows: "+str(round(newTime, 3))+"s, "+str(round(newTime*1000000/size, 2))+"us per candidate row"
+        if size<=legacyLimit:
+            legacyResult, legacyTime=timed(legacySimplifyPrimaryScoreRows, rows)
+            line=line+", legacy "+str(round(legacyTime, 3))+"s, identical result: "+str(legacyResult==result)
+        print line
+
+#Former matching of validation.validateFinaleScore, list membership and a cross check of every alternative with every miss
+def legacyCompareWithStandard(inputLongList, targetList, targetLongList, counterPosition):
+    inputList=[[row[0], row[1]] for row in inputLongList]
+    targetList=[list(line) for line in targetList]
+    missing=[]
+    matches=[]
+    for counter, line in enumerate(targetList):
+        if line not in inputList:
+            missing.append([line[0], line[1], "NoScore", targetLongList[counter][counterPosition], targetLongList[counter][1], targetLongList[counter][3]])
+        else:
+            for c in inputLongList:
+                if c[0]==line[0] and c[1]==line[1] or c[1]==line[0] and c[1]==line[1]:
+                    score=c[2]
+            matches.append([line[0], line[1], score, targetLongList[counter][counterPosition],targetLongList[counter][1], targetLongList[counter][3]])
+    alternatives=[]
+    for counter, line in enumerate(inputList):
+        if line not in targetList and line[1]!="UNKNOWN":
+            alternatives.append([line[0], line[1], inputLongList[counter][2], "noScore", inputLongList[counter][3], inputLongList[counter][4]])
+    alternativeCounter=0
+    for sug in alternatives:
+        for miss in missing:
+            if (sug[0]==miss[0] and sug[1]!=miss[1]) or (sug[0]!=miss[0] and sug[1]==miss[1]):
+                alternativeCounter=alternativeCounter+1
+    return matches, missing, alternatives, alternativeCounter
+
+#A standard of the given size and computed mappings that hit about half of it, with alternatives that share an IRI with the misses
+def validationData(rnd, size):
+    targetLongList=[]
+    for i in range(size):
+        targetLongList.append(["AA_"+str(i), "BB_"+str(rnd.randint(0, size)), "std", "label "+str(i), str(rnd.random())])
+    targetList=[(row[0], row[1]) for row in targetLongList]
+    inputLongList=[]
+    for i in range(size):
+        source, target=targetList[rnd.randint(0, size-1)]
+        choice=rnd.random()
+        if choice<0.2:
+            target="BB_"+str(rnd.randint(0, size))
+        elif choice<0.3:
+            source="AA_"+str(rnd.randint(0, size))
+        elif choice<0.32:
+            target="UNKNOWN"
+        elif choice<0.33:
+            source=target
+        inputLongList.append([source, target, rnd.random(), "label "+source, "label "+target])
+    return inputLongList, targetList, targetLongList
+
+def benchmarkValidation(sizes=(10000, 100000, 1000000), legacyLimit=10000):
+    print "validateFinaleScore, standard rows = computed mappings"
+    for size in sizes:
+        inputLongList, targetList, targetLongList=validationData(random.Random(42), size)
+        result, newTime=timed(validation.compareWithStandard, inputLongList, targetList, targetLongList, 4)
+        line="  "+str(size)+" rows: "+str(round(newTime, 3))+"s"
+        if size<=legacyLimit:
+            legacyResult, legacyTime=timed(legacyCompareWithStandard, inputLongList, targetList, targetLongList, 4)
+            line=line+", legacy "+str(round(legacyTime, 3))+"s, identical result: "+str(legacyResult==result)
+        print line
+
+#Former paxo.processOntologyPrimaryScore, scoreSimple for every source term and a sort of the best scores
+def legacyProcessOntologyPrimaryScore(pScore, params):
+    result=[paxo_internals.scoreSimple(line, params) for line in pScore]
+    tmp=[entry for entry in result if entry!=[]]
+    return sorted(tmp, key=lambda tmp:tmp[0]['finaleScore'], reverse=True)
+
+def benchmarkScoreSimple(sizes=(10000, 100000, 1000000)):
+    params={"fuzzyUpperLimit": 0.8, "fuzzyLowerLimit": 0.6,"fuzzyUpperFactor": 1,"fuzzyLowerFactor":0.6, "oxoDistanceOne":1, "oxoDistanceTwo":0.3, "oxoDistanceThree":0.1, "synFuzzyFactor":0.6, "bridgeOxoFactor":1, "threshold":0.6}
+    print "scoreSimple, columnar kernel against scoreSimple per source term (candidate rows)"
+    for size in sizes:
+        simplerMatrix=paxo_internals.simplifyPrimaryScoreRows(primaryScoreRows(random.Random(42), size))
+        columns, columnsTime=timed(scoreKernel.ScoreColumns, simplerMatrix)
+        result, kernelTime=timed(scoreKernel.scoreColumns, columns, params)
+        legacyResult, legacyTime=timed(legacyProcessOntologyPrimaryScore, simplerMatrix, params)
+        identical=[line[0] for line in legacyResult]==[line[0] for line in result]
+        print "  "+str(size)+": legacy "+str(round(legacyTime, 3))+"s, kernel "+str(round(kernelTime, 3))+"s (+"+str(round(columnsTime, 3))+"s to build the columns once), identical best mappings: "+str(identical)
+
+#Former paxo.curationOntologyFinalScore, list membership and index lookup of every mapped IRI
+def legacyCurationOntologyFinalScore(scoredMatrix):
+    endmap=[]
+    unified=[]
+    for counter, line in enumerate(scoredMatrix):
+        if line[1] not in endmap:
+            endmap.append(line[1])
+            unified.append(line)
+        else:
+            index=endmap.index(line[1])
+            if unified[index][2]<scoredMatrix[counter][2]:
+                unified[index]=scoredMatrix[counter]
+    return unified
+
+#Predicted mappings (sourceIRI, mappedIRI, score, sourceLabel, mappedLabel, normalizedScore), about 3 per target IRI
+def predictedMappings(rnd, size):
+    rows=[]
+    for i in range(size):
+        score=round(rnd.random()*4, 1)
+        rows.append(["http://purl.obolibrary.org/obo/AA_"+str(i), "http://purl.obolibrary.org/obo/BB_"+str(rnd.randint(0, size/3)), score, randomLabel(rnd), randomLabel(rnd), score/4.0])
+    return rows
+
+def benchmarkCuration(sizes=(10000, 100000, 1000000, 3000000), legacyLimit=10000):
+    print "curationOntologyFinalScore (uniqueMaps), predicted mappings"
+    for size in sizes:
+        rows=predictedMappings(random.Random(42), size)
+        result, newTime=timed(paxo_internals.uniqueMappings, rows, "target")
+        line="  "+str(size)+" rows: "+str(round(newTime, 3))+"s, "+str(len(result))+" unique"
+        oneToOne, oneToOneTime=timed(paxo_internals.uniqueMappings, rows, "both")
+        line=line+", one-to-one "+str(round(oneToOneTime, 3))+"s, "+str(len(oneToOne))+" kept"
+        if size<=legacyLimit:
+            legacyResult, legacyTime=timed(legacyCurationOntologyFinalScore, rows)
+            line=line+", legacy "+str(round(legacyTime, 3))+"s, identical result: "+str(legacyResult==result)
+        print line
+
+#Rows of the raw score with the values the score file has to keep apart: unicode labels, Oxo terms without label (None)
+#and unknown fuzzy matches with an int score
+def scoreFileRows(rnd, size):
+    rows=[]
+    for i in range(size):
+        oxoLabel=rnd.choice([randomLabel(rnd), unicode(randomLabel(rnd))+u" \u00e9", None])
+        fuzzy=[{'fuzzyMapping': randomLabel(rnd), 'fuzzyIri': "http://purl.obolibrary.org/obo/BB_"+str(rnd.randint(0, size)), 'fuzzyScore': round(rnd.random(), 5)}]
+        synFuzzy=[{'fuzzyScore': 0, 'fuzzyMapping': 'UNKNOWN', 'fuzzyIri': 'UNKNOWN'}]
+        oxo=[{'oxoCurie': "BB:"+str(rnd.randint(0, size)), 'distance': rnd.randint(1, 3), 'oxoLabel': oxoLabel, 'oxoScore': rnd.randint(0, 3)}]
+        bridge=[{'oxoCurie': "CC:"+str(rnd.randint(0, size)), 'distance': rnd.randint(1, 3), 'oxoScore': rnd.randint(0, 3)}]
+        rows.append((randomLabel(rnd), "http://purl.obolibrary.org/obo/AA_"+str(i), fuzzy, oxo, synFuzzy, bridge))
+    return rows
+
+def benchmarkScoreFile(sizes=(10000, 100000)):
+    print "scoreFile, pack and unpack a chunk of raw score rows"
+    for size in sizes:
+        rows=scoreFileRows(random.Random(42), size)
+        payload, packTime=timed(scoreFile.packChunk, rows)
+        result, unpackTime=timed(scoreFile.unpackChunk, payload)
+        same=result==rows and [type(row[3][0]['oxoLabel']) for row in result]==[type(row[3][0]['oxoLabel']) for row in rows]
+        print "  "+str(size)+" rows: pack "+str(round(packTime, 3))+"s, unpack "+str(round(unpackTime, 3))+"s, "+str(len(payload))+" bytes, identical rows: "+str(same)
+
+benchmarks={"stringMatcher": benchmarkStringMatcher, "primaryScore": benchmarkPrimaryScore, "validation": benchmarkValidation, "scoreSimple": benchmarkScoreSimple, "curation": benchmarkCuration, "scoreFile": benchmarkScoreFile}
+
+if __name__ == '__main__':
+    names=sys.argv[1:]
+    if len(names)==0:
+        names=sorted(benchmarks.keys())
+    for name in names:
+        benchmarks[name]()
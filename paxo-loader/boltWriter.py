@@ -0,0 +1,78 @@
+import time
+import random
+import logging
+import functools
+from multiprocessing.dummy import Pool as ThreadPool
+
+from neo4j import SessionExpired
+from neo4j.exceptions import TransientError, ServiceUnavailable, DatabaseUnavailableError
+
+#Writes the exported terms and mappings over bolt in UNWIND batches instead of LOAD CSV, so neo4j does not need to
+#read the files of the neoFolder. A few sessions send batches in parallel, a batch that fails for a transient reason
+#(e.g. a deadlock between the sessions) is sent again after a jittered exponential delay
+
+#Same statements as writeTermsToNeo and writeMappingsToNeo of the neoExporter, one row of the batch per line
+loadTermsCypher="""UNWIND $rows AS line
+                MATCH (d:Datasource {prefix : line.prefix})
+                WITH d, line
+                MERGE (t:Term { id: line.identifier, curie: line.curie})
+                ON CREATE SET t.label = line.label, t.uri = line.uri
+                WITH t,d
+                CREATE (t)-[:HAS_SOURCE]->(d)"""
+
+loadMappingsCypher="""UNWIND $rows AS line
+                MATCH (f:Term { curie: line.fromCurie}),(t:Term { curie: line.toCurie})
+                WITH f,t,line
+                CREATE (f)-[m:MAPPING { sourcePrefix: line.datasourcePrefix, datasource: line.datasource, sourceType: line.sourceType, scope: line.scope, date: line.date}]->(t)"""
+
+retryableErrors=(TransientError, ServiceUnavailable, SessionExpired, DatabaseUnavailableError)
+
+class BoltWriter:
+    def __init__(self, driver, batchSize=10000, writers=4, retries=5):
+        self.driver=driver
+        self.batchSize=batchSize
+        self.writers=writers
+        self.retries=retries
+
+    #Rows are lists in the column order of the header, like the rows of the csv files
+    def writeTerms(self, header, rows):
+        return self.write(loadTermsCypher, header, rows, "terms")
+
+    def writeMappings(self, header, rows):
+        return self.write(loadMappingsCypher, header, rows, "mappings")
+
+    def write(self, cypher, header, rows, name):
+        print "Write "+str(len(rows))+" "+name+" over bolt, "+str(self.batchSize)+" rows per batch, "+str(self.writers)+" writers"
+        start=time.time()
+        written=0
+        batches=[[dict(zip(header, row)) for row in rows[i:i+self.batchSize]] for i in range(0, len(rows), self.batchSize)]
+        pool=ThreadPool(self.writers)
+        try:
+            for count in pool.imap_unordered(functools.partial(self.writeBatch, cypher), batches):
+                written=written+count
+                elapsed=max(time.time()-start, 0.001)
+                print str(written)+" of "+str(len(rows))+" "+name+" written, "+str(int(written/elapsed))+" rows/s"
+        finally:
+            pool.close()
+            pool.join()
+
+        elapsed=max(time.time()-start, 0.001)
+        print "Wrote "+str(written)+" "+name+" in "+str(round(elapsed, 1))+"s ("+str(int(written/elapsed))+" rows/s)"
+        logging.info("Wrote "+str(written)+" "+name+" over bolt in "+str(round(elapsed, 1))+"s")
+        return written
+
+    def writeBatch(self, cypher, batch):
+        attempt=0
+        while True:
+            try:
+                with self.driver.session() as session:
+                    session.write_transaction(lambda tx: tx.run(cypher, rows=batch).consume())
+                return len(batch)
+            except retryableErrors as e:
+                if attempt>=self.retries:
+                    logging.error("Batch of "+str(len(batch))+" rows failed "+str(attempt+1)+" times, giving up")
+                    raise
+                delay=random.uniform(0, min(60, 2**attempt))
+                logging.info("Batch failed ("+str(e)+"), try again after "+str(round(delay, 1))+" seconds")
+                time.sleep(delay)
+                attempt=attempt+1
@@ -0,0 +1,176 @@
+import time
+import random
+import logging
+import threading
+import calendar
+import requests
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_tz, mktime_tz
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+#Status codes that are worth another try, everything else is returned to the caller
+RETRY_STATUS=[429, 500, 502, 503, 504]
+
+#Circuit breaker for one host. Opens after failureThreshold failures in a row, calls to the host then wait until a single
+#trial call is let through after resetTimeout seconds. If the trial succeeds the waiting calls go on, otherwise the circuit
+#opens again. Calls are only delayed, never dropped, so an outage of the webservice pauses a run instead of ending it
+class CircuitBreaker:
+    def __init__(self, host, failureThreshold, resetTimeout):
+        self.host=host
+        self.failureThreshold=failureThreshold
+        self.resetTimeout=resetTimeout
+        self.failures=0
+        self.openedAt=None
+        self.trialAt=None
+        self.condition=threading.Condition(threading.Lock())
+
+    def before(self):
+        with self.condition:
+            while self.openedAt!=None:
+                now=time.time()
+                #A trial that neither succeeded nor failed (e.g. an unexpected exception) is taken over after resetTimeout
+                if self.trialAt!=None and now-self.trialAt<self.resetTimeout:
+                    self.condition.wait(self.resetTimeout-(now-self.trialAt))
+                    continue
+                if now-self.openedAt>=self.resetTimeout:
+                    #Half open, this call is the trial
+                    self.trialAt=now
+                    return
+                self.condition.wait(self.resetTimeout-(now-self.openedAt))
+
+    def success(self):
+        with self.condition:
+            if self.openedAt!=None:
+                logging.info("Circuit for "+self.host+" closed again")
+            self.failures=0
+            self.openedAt=None
+            self.trialAt=None
+            self.condition.notify_all()
+
+    def failure(self):
+        with self.condition:
+            self.failures=self.failures+1
+            if self.trialAt!=None:
+                logging.info("Trial call to "+self.host+" failed, circuit stays open for another "+str(self.resetTimeout)+" seconds")
+                self.openedAt=time.time()
+                self.trialAt=None
+                self.condition.notify_all()
+            elif self.failures>=self.failureThreshold and self.openedAt==None:
+                logging.error("Circuit for "+self.host+" opened after "+str(self.failures)+" failures in a row, calls wait "+str(self.resetTimeout)+" seconds")
+                self.openedAt=time.time()
+
+#HTTP client shared by all paxo webservice calls. Uses one pooled keep-alive session, retries failed calls and
+#calls answered with a RETRY_STATUS with jittered exponential backoff and respects Retry-After headers
+class HttpClient:
+    def __init__(self, retries=4, backoffBase=2.0, backoffMax=300, timeout=120, failureThreshold=10, resetTimeout=60, poolSize=20):
+        self.retries=retries
+        self.backoffBase=backoffBase
+        self.backoffMax=backoffMax
+        self.timeout=timeout
+        self.failureThreshold=failureThreshold
+        self.resetTimeout=resetTimeout
+
+        self.session=requests.Session()
+        adapter=HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.breakers={}
+        self.lock=threading.Lock()
+        self.calls=0
+        self.failures=0
+        #Optional semaphore that limits the number of calls in flight, shared by all processes that run sections in parallel
+        self.limiter=None
+
+    def breaker(self, url):
+        host=urlparse(url).netloc
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host]=CircuitBreaker(host, self.failureThreshold, self.resetTimeout)
+            return self.breakers[host]
+
+    #Full jitter, a random delay between 0 and the exponential backoff of that attempt
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoffMax, self.backoffBase*(2**attempt)))
+
+    #Retry-After is either a number of seconds or a http date
+    def retryAfter(self, response):
+        value=response.headers.get("Retry-After")
+        if value==None:
+            return None
+        try:
+            delay=float(value)
+        except ValueError:
+            date=parsedate_tz(value)
+            if date==None:
+                return None
+            delay=mktime_tz(date)-calendar.timegm(time.gmtime())
+        return min(self.backoffMax, max(0, delay))
+
+    def get(self, url, params=None):
+        breaker=self.breaker(url)
+        attempt=0
+        while True:
+            breaker.before()
+            with self.lock:
+                self.calls=self.calls+1
+            try:
+                if self.limiter!=None:
+                    with self.limiter:
+                        r=self.session.get(url, params=params, timeout=self.timeout)
+                else:
+                    r=self.session.get(url, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                breaker.failure()
+                with self.lock:
+                    self.failures=self.failures+1
+                if attempt>=self.retries:
+                    logging.error("Call failed "+str(attempt+1)+" times, giving up: "+url)
+                    logging.error(params)
+                    raise
+                delay=self.backoff(attempt)
+                logging.info("API exception ("+str(e)+"), try again after "+str(round(delay, 1))+" seconds")
+            else:
+                if r.status_code not in RETRY_STATUS:
+                    breaker.success()
+                    return r
+                breaker.failure()
+                with self.lock:
+                    self.failures=self.failures+1
+                if attempt>=self.retries:
+                    logging.error("Call answered with status "+str(r.status_code)+" "+str(attempt+1)+" times, giving up: "+r.url)
+                    r.raise_for_status()
+                delay=self.retryAfter(r)
+                if delay==None:
+                    delay=self.backoff(attempt)
+                logging.info("API returned status "+str(r.status_code)+", try again after "+str(round(delay, 1))+" seconds")
+
+            time.sleep(delay)
+            attempt=attempt+1
+
+#Client used by default, replaced by configure
+client=HttpClient()
+
+def configure(retries, backoffMax, timeout, failureThreshold, resetTimeout):
+    global client
+    client=HttpClient(retries=retries, backoffMax=backoffMax, timeout=timeout, failureThreshold=failureThreshold, resetTimeout=resetTimeout)
+    return client
+
+#Sets the semaphore that limits concurrent calls, e.g. a multiprocessing.BoundedSemaphore created before worker processes are forked
+def setLimiter(limiter):
+    client.limiter=limiter
+
+#New client with the same settings, for a forked worker process that must not share the connections of its parent
+def renew():
+    global client
+    limiter=client.limiter
+    client=HttpClient(retries=client.retries, backoffBase=client.backoffBase, backoffMax=client.backoffMax, timeout=client.timeout, failureThreshold=client.failureThreshold, resetTimeout=client.resetTimeout)
+    client.limiter=limiter
+    return client
+
+def get(url, params=None):
+    return client.get(url, params)
@@ -1,9 +1,28 @@
 #import clientOperations as paxo
 import paxo_internals
 import csv
-import requests
 import time
 import logging
+import threading
+import functools
+from multiprocessing.dummy import Pool as ThreadPool
+
+#Number of input rows read, scored and written at a time
+batchSize=1000
+
+#Replacements of the list processing, shared with the scoring service
+replacementTerms={
+"ordo_hp" : [('cancer', 'carcinom'), ('cancer', 'neoplasm'), ('cancer','carcinoma'),('tumor', 'neoplasm'), ('tumor','cancer'), ('abnormality', 'disease'), ('decreased', 'reduced'), ('morphology', '')],
+"doid_mp" : [],
+"doid_ordo" :[],
+"hp_doid" : [('cancer', 'neoplasm'), ('cancer','carcinoma'), ('abnormality','disease'), 'abnormality','disease'],
+"hp_mp" : [('cancer', 'carcinom'), ('cancer', 'neoplasm'), ('cancer','carcinoma'),('abnormality','disease'), ('abnormal','Abnormality')],
+"ordo_mp" : []
+}
+
+#Score parameters of the list processing and the scoring service
+def scoreParameters(stopwordList):
+    return {"removeStopwordsList": stopwordList, "replaceTermList" : replacementTerms}
 
 def runListProcessing(options, params, scoreParams):
 
@@ -11,104 +30,188 @@ def runListProcessing(options, params, scoreParams):
     resultFile=options["resultFile"]
     delimiter=options["delimiter"]
     targetOntology=options["targetOntology"]
-    detailLevel=options["detailLevel"]
     synonymSplitChar=options["synonymSplitChar"]
+    workers=options.get("workers", 1)
 
-    #Open the input file
-    with open(inputFile) as csvfile:
-        readCSV = csv.reader(csvfile, delimiter=str(delimiter))
-        next(readCSV)   #Skip the headers
+    #Labels of mapped IRIs that had to be looked up, shared by all workers
+    labelLookup={"labels": {}, "lock": threading.Lock(), "url": params['ols']+"search"}
+    scoreLabel=functools.partial(paxo_internals.scoreTermLabel, targetOntology=targetOntology, scoreParams=scoreParams, params=params)
+    buildRow=functools.partial(processRow, options=options, labelLookup=labelLookup)
+
+    #Bounded pool of workers for the labels of a batch, with only one worker the labels are scored one after another
+    pool=None
+    if workers>1:
+        logging.info("Score labels with "+str(workers)+" workers")
+        pool=ThreadPool(workers)
+
+    try:
+        #First pass, count the normalised labels and synonyms. Every unique label is scored once, its result is
+        #kept until the last row that uses it is written
+        remaining=countInputLabels(inputFile, delimiter, synonymSplitChar)
+        total=sum(remaining.values())
+        dedupRatio=0.0
+        if total>0:
+            dedupRatio=round(len(remaining)*100.0/total, 2)
+        msg="Input has "+str(total)+" labels and synonyms, "+str(len(remaining))+" unique after normalisation ("+str(dedupRatio)+"% of the labels are scored)"
+        print msg
+        logging.info(msg)
 
-        try:
-            replyList=[]
-
-            #Adding Headers to the result file
-            replyList.append(['inputID','inputLabel','mappedId',"mappedLabel","Score"])
-            counter=0
-            #tmpReadCSV=readCSV
-            #totalLength=len(list(tmpReadCSV))
-            logging.info("Start going through input csv")
-            for index,row in enumerate(readCSV):
-                potentialReply=[]
-                #Execute label in the first row
-                prefLabel=row[1].encode(encoding='UTF-8')
-
-                if len(row)>2:
-                    synList=row[2].split(synonymSplitChar)
-                else:
-                    synList=[]
-
-                #print prefLabel
-                tmpReply=paxo_internals.scoreTermLabel(prefLabel, targetOntology, scoreParams, params)
-
-                if tmpReply!=[]:
-                    potentialReply.append(tmpReply)
-
-                for syn in synList:
-                    #print " --> "+syn
-                    tmpReply=paxo_internals.scoreTermLabel(syn.strip().encode(encoding='UTF-8'), targetOntology, scoreParams, params)
-                    if tmpReply!=[]:
-                        potentialReply.append(tmpReply)
-
-                #Sort all potential replies via the score, so the highest score is first
-                try:
-                    potentialReply=sorted(potentialReply, key=lambda potentialReply:potentialReply[0]['finaleScore'], reverse=True)[0]
-                    if detailLevel<1:
-                        replyList.append([row[0].encode(encoding='UTF-8'),prefLabel,potentialReply[0]['iri'].encode(encoding='UTF-8'),"", potentialReply[0]['fuzzyScore']])
-                    elif detailLevel==1:
-                        detail=[]
-                        for tmpReply in potentialReply:
-                            detail.append({"mappedIRI":tmpReply['iri'], "score":tmpReply['fuzzyScore']})
-                        replyList.append([row[0].encode(encoding='UTF-8'),prefLabel,potentialReply[0]['iri'].encode(encoding='UTF-8'),"", potentialReply[0]['fuzzyScore'], detail])
-                    elif detailLevel>1:
-                        replyList.append([row[0].encode(encoding='UTF-8'),prefLabel,potentialReply[0]['iri'].encode(encoding='UTF-8'),"", potentialReply[0]['fuzzyScore'], potentialReply])
-                except Exception as e:
-                    #If the exception just arises because of and empty reply, we simply did not find a match and can move on
-                    if potentialReply==[]:
-                        replyList.append([row[0].encode(encoding='UTF-8'),prefLabel, "no match found", "", 0])
-                    #Another error occured, this is something to look into!
+        scored={}
+        #Open the input file
+        with open(inputFile) as csvfile:
+            readCSV = csv.reader(csvfile, delimiter=str(delimiter))
+            next(readCSV)   #Skip the headers
+
+            #Results are written batch by batch in the order of the input file
+            with open(resultFile, 'wb') as f:
+                writer = csv.writer(f)
+                #Adding Headers to the result file
+                writer.writerow(['inputID','inputLabel','mappedId',"mappedLabel","Score"])
+                counter=0
+                logging.info("Start going through input csv")
+                for batch in readBatches(readCSV, batchSize):
+                    keys=[]
+                    labels=[]
+                    for row in batch:
+                        for key, label in rowLabels(row, synonymSplitChar):
+                            if key not in scored:
+                                scored[key]=None
+                                keys.append(key)
+                                labels.append(label)
+                    if pool!=None:
+                        replies=pool.map(scoreLabel, labels)
+                    else:
+                        replies=map(scoreLabel, labels)
+                    scored.update(zip(keys, replies))
+
+                    rows=[(row, [scored[key] for key, label in rowLabels(row, synonymSplitChar)]) for row in batch]
+                    if pool!=None:
+                        replyList=pool.map(buildRow, rows)
                     else:
-                        print e
-                        print "Problem getting results for "+prefLabel+" - the reply was "+potentialReply
-                        logging.error("Problem getting results for "+prefLabel+" - the reply was "+potentialReply)
-                        logging.error(e)
-                        raise
-
-                #This is just to print feedback - if we work on a large list
-                counter=counter+1
-                if counter%20==0:
+                        replyList=map(buildRow, rows)
+                    writer.writerows(replyList)
+                    f.flush()
+
+                    #Forget the results of labels that do not come again
+                    for row in batch:
+                        for key, label in rowLabels(row, synonymSplitChar):
+                            remaining[key]=remaining[key]-1
+                            if remaining[key]==0:
+                                del remaining[key]
+                                del scored[key]
+
+                    #This is just to print feedback - if we work on a large list
+                    counter=counter+len(batch)
                     print "Processed "+str(counter)+" entries"
                     logging.info("Processed "+str(counter)+" entries")
+                    logging.info(paxo_internals.labelCache.stats())
 
-    ### annotating file
-            print "Done processing input list, now annotate the result"
-            olsurl=params['ols']+"search"
-            for row in replyList[1:]:
-                if row[2]=="no match found":
-                    row[3]="no label found"
-                else:
-                    data={'q':row[2],'queryFields':'iri', 'fieldList': 'label', "ontology":targetOntology, "type":"class", "local":True}
-                    r = requests.get(olsurl, data)
-                    jsonReply=r.json()
-                    try:
-                        row[3]=jsonReply['response']['docs'][0]['label'].encode(encoding='UTF-8')
-                    except Exception as e:
-                        row[3]="no label found"
-                        logging.error("No label found for "+row[2])
-                        logging.error(e)
-
-    ### write to file
-            print "Done annotating file, now write result to file"
-            logging.info("Done annotating file, now write result to file")
-            #Writing result to output file
-            with open(resultFile, 'wb') as f:
-                writer = csv.writer(f)
-                writer.writerows(replyList)
-                f.close()
+        paxo_internals.logLabelCacheStats()
+        print "Done processing input list, looked up "+str(len(labelLookup["labels"]))+" labels of mapped terms"
+        logging.info("Done processing input list, looked up "+str(len(labelLookup["labels"]))+" labels of mapped terms")
 
-        #In case there is an error, print the exception
-        except Exception as e:
-            print "Error while processing file"
+    #In case there is an error, print the exception
+    except Exception as e:
+        print "Error while processing file"
+        print e
+        logging.error("Error while processing file")
+        logging.error(e)
+
+    finally:
+        if pool!=None:
+            pool.close()
+            pool.join()
+
+#Key of a label for the dedup: labels that only differ in case and whitespace are scored once. The key is not scored
+#itself, the scoring is case sensitive
+def normaliseInputLabel(label):
+    return ' '.join(label.lower().split())
+
+#(key, label) of the label and synonyms of an input row, UTF-8 encoded. The label is spelled like in the input file,
+#synonyms are stripped. A key is scored with the first spelling that was seen for it
+def rowLabels(row, synonymSplitChar):
+    labels=[row[1]]
+    if len(row)>2:
+        labels=labels+[syn.strip() for syn in row[2].split(synonymSplitChar)]
+    return [(normaliseInputLabel(label).encode(encoding='UTF-8'), label.encode(encoding='UTF-8')) for label in labels]
+
+#Number of rows every normalised label and synonym is used in, counted once per use
+def countInputLabels(inputFile, delimiter, synonymSplitChar):
+    counts={}
+    with open(inputFile) as csvfile:
+        readCSV = csv.reader(csvfile, delimiter=str(delimiter))
+        next(readCSV)   #Skip the headers
+        for row in readCSV:
+            for key, label in rowLabels(row, synonymSplitChar):
+                counts[key]=counts.get(key, 0)+1
+    return counts
+
+#Yields lists of up to size rows, so the input file is never read completely into memory
+def readBatches(readCSV, size):
+    batch=[]
+    for row in readCSV:
+        batch.append(row)
+        if len(batch)==size:
+            yield batch
+            batch=[]
+    if len(batch)>0:
+        yield batch
+
+#Builds the row of the result file from an input row and the scores of its label and synonyms
+def processRow(rowReplies, options, labelLookup):
+    row, replies=rowReplies
+    targetOntology=options["targetOntology"]
+    detailLevel=options["detailLevel"]
+
+    prefLabel=row[1].encode(encoding='UTF-8')
+    potentialReply=[tmpReply for tmpReply in replies if tmpReply!=[]]
+
+    #Sort all potential replies via the score, so the highest score is first
+    try:
+        potentialReply=sorted(potentialReply, key=lambda potentialReply:potentialReply[0]['finaleScore'], reverse=True)[0]
+        mappedLabel=getMappedLabel(potentialReply[0], targetOntology, labelLookup)
+        if detailLevel<1:
+            return [row[0].encode(encoding='UTF-8'),prefLabel,potentialReply[0]['iri'].encode(encoding='UTF-8'),mappedLabel, potentialReply[0]['fuzzyScore']]
+        elif detailLevel==1:
+            detail=[]
+            for tmpReply in potentialReply:
+                detail.append({"mappedIRI":tmpReply['iri'], "score":tmpReply['fuzzyScore']})
+            return [row[0].encode(encoding='UTF-8'),prefLabel,potentialReply[0]['iri'].encode(encoding='UTF-8'),mappedLabel, potentialReply[0]['fuzzyScore'], detail]
+        elif detailLevel>1:
+            return [row[0].encode(encoding='UTF-8'),prefLabel,potentialReply[0]['iri'].encode(encoding='UTF-8'),mappedLabel, potentialReply[0]['fuzzyScore'], potentialReply]
+    except Exception as e:
+        #If the exception just arises because of and empty reply, we simply did not find a match and can move on
+        if potentialReply==[]:
+            return [row[0].encode(encoding='UTF-8'),prefLabel, "no match found", "no label found", 0]
+        #Another error occured, this is something to look into!
+        else:
             print e
-            logging.error("Error while processing file")
+            print "Problem getting results for "+prefLabel+" - the reply was "+str(potentialReply)
+            logging.error("Problem getting results for "+prefLabel+" - the reply was "+str(potentialReply))
             logging.error(e)
+            raise
+
+#Label of the mapped term. The fuzzy and the oxo search already return it with the candidate, only candidates without
+#a label (e.g. from bridge evidence) are looked up in OLS, once per IRI
+def getMappedLabel(mapping, targetOntology, labelLookup):
+    label=mapping.get('label', "UNKNOWN")
+    if label!="UNKNOWN" and label!=None:
+        return label.encode(encoding='UTF-8')
+
+    iri=mapping['iri']
+    with labelLookup["lock"]:
+        if iri in labelLookup["labels"]:
+            return labelLookup["labels"][iri]
+
+    data={'q':iri,'queryFields':'iri', 'fieldList': 'label', "ontology":targetOntology, "type":"class", "local":True}
+    r = paxo_internals.apiCall(labelLookup["url"], data)
+    try:
+        label=r.json()['response']['docs'][0]['label'].encode(encoding='UTF-8')
+    except Exception as e:
+        label="no label found"
+        logging.error("No label found for "+iri)
+        logging.error(e)
+
+    with labelLookup["lock"]:
+        labelLookup["labels"][iri]=label
+    return label
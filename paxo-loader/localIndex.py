@@ -0,0 +1,91 @@
+import os
+import json
+import logging
+from collections import defaultdict
+
+#Local candidate index for the labels and synonyms of one ontology. Replaces the OLS search in olsFuzzyMatch,
+#candidates are ranked by the overlap of character trigrams between the query and the label/synonyms of a term
+class OntologyIndex:
+    def __init__(self, ontology, docs):
+        self.ontology=ontology
+        self.docs=docs
+        #trigram -> list of (doc position, number of trigrams of that text)
+        self.postings=defaultdict(list)
+        for position, doc in enumerate(docs):
+            texts=[doc['label']]
+            if 'synonym' in doc:
+                texts=texts+doc['synonym']
+            for text in texts:
+                grams=trigrams(text)
+                for gram in grams:
+                    self.postings[gram].append((position, len(grams)))
+
+    #Returns a reply in the form of the OLS search response, docs with iri, label and synonym
+    def search(self, query, limit=10):
+        grams=trigrams(query)
+        overlap=defaultdict(int)
+        for gram in grams:
+            for position, size in self.postings.get(gram, ()):
+                key=(position, size)
+                overlap[key]=overlap[key]+1
+
+        #Dice coefficient of the trigram sets, best text of a term counts
+        best={}
+        for (position, size), count in overlap.items():
+            score=2.0*count/(len(grams)+size)
+            if score>best.get(position, 0):
+                best[position]=score
+
+        ranked=sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        docs=[self.docs[position] for position, score in ranked]
+        return {"numFound": len(docs), "docs": docs}
+
+def normalise(text):
+    if isinstance(text, str):
+        text=text.decode('utf-8')
+    return u' '.join(text.lower().split())
+
+def trigrams(text):
+    text=u'  '+normalise(text)+u' '
+    return set(text[i:i+3] for i in range(len(text)-2))
+
+#Downloads the terms defined in an ontology via the paged OLS terms endpoint
+def downloadTerms(ontology, olsURL, apiCall):
+    termsUrl=olsURL+"ontologies/"+ontology+"/terms?size=500&fieldList=iri,label,synonym"
+    docs=[]
+    while True:
+        r=apiCall(termsUrl, None).json()
+        for term in r['_embedded']['terms']:
+            #Same as the local flag of the OLS search, only terms defined in this ontology
+            if term['is_defining_ontology'] is not True:
+                continue
+            doc={"iri": term['iri'], "label": term['label']}
+            if term['synonyms']!=None and len(term['synonyms'])>0:
+                doc['synonym']=term['synonyms']
+            docs.append(doc)
+        try:
+            termsUrl=r['_links']['next']['href']
+        except KeyError:
+            break
+    return docs
+
+#Builds the index of an ontology. If a snapshot folder is given, the terms are read from (or saved to) a snapshot file there,
+#so later runs are reproducible against the same version of the ontology
+def loadIndex(ontology, olsURL, apiCall, snapshotFolder=None):
+    snapshotFile=None
+    if snapshotFolder!=None:
+        snapshotFile=os.path.join(snapshotFolder, ontology+"_terms.json")
+
+    if snapshotFile!=None and os.path.exists(snapshotFile):
+        logging.info("Read terms of "+ontology+" from snapshot "+snapshotFile)
+        with open(snapshotFile) as f:
+            docs=json.load(f)
+    else:
+        logging.info("Download terms of "+ontology+" for the local index")
+        docs=downloadTerms(ontology, olsURL, apiCall)
+        if snapshotFile!=None:
+            with open(snapshotFile, 'w') as f:
+                json.dump(docs, f)
+
+    logging.info("Local index for "+ontology+" holds "+str(len(docs))+" terms")
+    return OntologyIndex(ontology, docs)
@@ -1,8 +1,13 @@
 import csv
 import logging
 import paxo_internals
+import boltWriter
 import time
+import json
+import os
+import functools
 from datetime import datetime
+from multiprocessing.dummy import Pool as ThreadPool
 
 from neo4j.v1 import GraphDatabase, basic_auth
 
@@ -89,11 +94,67 @@ def createNode(iri, ontology, olsURL):
         print "Therefor this node/mapping is not included in the export!"
         return []
 
+#Term lines (identifier, curie, label, uri, prefix) of the IRIs of an ontology that were resolved in earlier exports.
+#Terms that could not be resolved are not kept, so they are tried again next time
+def termCacheFile(cacheFolder, ontology):
+    return os.path.join(cacheFolder, ontology+'_termCache.json')
+
+def readTermCache(cacheFolder, ontology):
+    if cacheFolder==None or os.path.exists(termCacheFile(cacheFolder, ontology))==False:
+        return {}
+    with open(termCacheFile(cacheFolder, ontology)) as f:
+        terms=json.load(f)
+    return dict((iri.encode('utf-8'), [value.encode('utf-8') for value in line]) for iri, line in terms.items())
+
+#Merged with the file as it is now, another section may have exported terms of the same ontology in the meantime
+def writeTermCache(cacheFolder, ontology, terms):
+    cached=readTermCache(cacheFolder, ontology)
+    cached.update(terms)
+    cacheFile=termCacheFile(cacheFolder, ontology)
+    with open(cacheFile+'.'+str(os.getpid())+'.tmp', 'w') as f:
+        json.dump(cached, f)
+    os.rename(cacheFile+'.'+str(os.getpid())+'.tmp', cacheFile)
+
+#Resolves every distinct IRI once, the ones not in the term cache with parallel OLS calls. Returns IRI -> term line ([] if not found)
+def resolveNodes(iris, ontology, olsURL, workers=1, cacheFolder=None):
+    cached=readTermCache(cacheFolder, ontology)
+    nodes=dict((iri, cached[iri]) for iri in iris if iri in cached)
+    missing=[iri for iri in iris if iri not in nodes]
+    print "Resolve "+str(len(iris))+" terms of "+ontology+", "+str(len(nodes))+" from the term cache, "+str(len(missing))+" from OLS"
+    logging.info("Resolve "+str(len(iris))+" terms of "+ontology+", "+str(len(nodes))+" from the term cache, "+str(len(missing))+" from OLS")
+
+    resolve=functools.partial(createNode, ontology=ontology, olsURL=olsURL)
+    if workers>1 and len(missing)>1:
+        pool=ThreadPool(min(workers, len(missing)))
+        try:
+            lines=pool.map(resolve, missing)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        lines=map(resolve, missing)
+    resolved=dict(zip(missing, lines))
+    nodes.update(resolved)
+
+    if cacheFolder!=None:
+        writeTermCache(cacheFolder, ontology, dict((iri, line) for iri, line in resolved.items() if line!=[]))
+    return nodes
+
 def createMap(curie1, curie2, score):
     line=list([curie1, curie2, 'paxo', 'paxo', 'ALGORITHM', 'PREDICTED', date, score])
     return line
 
-def exportInNeo(onto1, onto2, predictedFolder, targetFolder, olsURL, neoURL, neoUser, neoPW):
+#Values in the order of their first appearance, without duplicates
+def distinct(values):
+    seen=set()
+    result=[]
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            result.append(value)
+    return result
+
+def exportInNeo(onto1, onto2, predictedFolder, targetFolder, olsURL, neoURL, neoUser, neoPW, workers=1, cacheFolder=None, bolt=False, boltBatchSize=10000, boltWriters=4):
     predictedFile=predictedFolder+'calculated_output_'+onto1+"_"+onto2+".csv"
 
     uri=neoURL
@@ -112,15 +173,22 @@ def exportInNeo(onto1, onto2, predictedFolder, targetFolder, olsURL, neoURL, neo
     with open(predictedFile) as csvfile:
         readCSV = csv.reader(csvfile, delimiter=str(','))
         next(readCSV)
-        counter=0
-        for row in readCSV:
-            firstRow=createNode(row[0], onto1, olsURL)
-            secondRow=createNode(row[1], onto2, olsURL)
+        rows=list(readCSV)
 
-            if firstRow!=[]:
-                paxo_term.append(firstRow)
-            if secondRow!=[]:
-                paxo_term.append(secondRow)
+        #Every distinct IRI is resolved once
+        sourceNodes=resolveNodes(distinct(row[0] for row in rows), onto1, olsURL, workers, cacheFolder)
+        targetNodes=resolveNodes(distinct(row[1] for row in rows), onto2, olsURL, workers, cacheFolder)
+
+        #Every term is written once, in the order it first appears in the predicted mappings
+        writtenTerms=set()
+        for row in rows:
+            firstRow=sourceNodes[row[0]]
+            secondRow=targetNodes[row[1]]
+
+            for termRow in (firstRow, secondRow):
+                if termRow!=[] and termRow[1] not in writtenTerms:
+                    writtenTerms.add(termRow[1])
+                    paxo_term.append(termRow)
 
             if firstRow!=[] and secondRow!=[]:
                 paxo_mappings.append(createMap(firstRow[1],secondRow[1], row[2]))
@@ -135,8 +203,14 @@ def exportInNeo(onto1, onto2, predictedFolder, targetFolder, olsURL, neoURL, neo
             writer.writerows(paxo_mappings)
             f.close()
 
-        writeTermsToNeo(targetFolder+onto1+"_"+onto2+'_termsNeo.csv', session)
-        writeMappingsToNeo(targetFolder+onto1+"_"+onto2+'_mappingsNeo.csv', session)
+        #Over bolt the rows are sent directly, otherwise neo4j loads the csv files from the neoFolder
+        if bolt==True:
+            writer=boltWriter.BoltWriter(driver, boltBatchSize, boltWriters)
+            writer.writeTerms(paxo_term[0], paxo_term[1:])
+            writer.writeMappings(paxo_mappings[0], paxo_mappings[1:])
+        else:
+            writeTermsToNeo(targetFolder+onto1+"_"+onto2+'_termsNeo.csv', session)
+            writeMappingsToNeo(targetFolder+onto1+"_"+onto2+'_mappingsNeo.csv', session)
 
 
         #After Loading, update solr indexes (Might be done outside of this script so commented out for now)
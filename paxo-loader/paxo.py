@@ -3,18 +3,75 @@ import logging
 import validation
 import csv
 import time
-import requests
+import httpClient
 import json
+import hashlib
 import os
 from ConfigParser import SafeConfigParser
 import ast
 import neoExporter
 import sys
 import listprocessing
+import scoreFile
+import scoreKernel
+import functools
+import itertools
+import random
+import multiprocessing
+from multiprocessing.dummy import Pool as ThreadPool
+
+#Runs the primary scoring for a single term of a OLS terms page. Returns the row for the scoring output or None if the term is skipped
+def scoreOntologyTerm(term, targetOntology, scoreParams, urls, useLocalOnly):
+    originalLabel=term["label"]
+    synonyms=term["synonyms"]
+
+    #Check if the term is actually defined in that ontology. Via flag it can be changed to process all terms
+    if term['is_defining_ontology'] is not True and term['is_defining_ontology'] is not useLocalOnly:
+        return None
+
+    pscore=paxo_internals.scoreTermOLS(term["iri"], originalLabel, targetOntology, scoreParams, urls)
+    try:
+        calculatedMappings=paxo_internals.processPScore(pscore)
+    except Exception as e:
+        print "Exception in primary Scoring"
+        print e
+        print term["iri"]
+        print originalLabel
+        print targetOntology
+        logging.info("Exception in primary Scoring")
+        logging.info(term["iri"]+" "+originalLabel)
+        calculatedMappings={'sourceTerm':term["iri"]+"ERROR", "olsFuzzyScore": [], "oxoScore": [], "bridgeEvidence": []}
+
+    #If synonyms are available, run through the same steps with synonyms to score an ontology
+    synCalculatedMappings={}
+    if synonyms!=None:
+        for synonym in synonyms:
+            try:
+                synPscore=paxo_internals.primaryScoreTerm('', synonym, targetOntology, scoreParams, urls)
+                synCalculatedMappings=paxo_internals.processPScore(synPscore)         #Process the primaryScore for synonyms
+                synCalculatedMappings['sourceIRI']=term["iri"]
+            except Exception as e:
+                print "Exception in Synonym processPScore Term"
+                print e
+                synCalculatedMappings={'sourceTerm':term["iri"]+"ERROR", "olsFuzzyScore": [], "oxoScore": [], "bridgeEvidence": []}
+                logging.info("Exception in  Synonym processPScore Term")
+                logging.info(term["iri"]+" "+synonym+" "+targetOntology)
+                synCalculatedMappings['olsFuzzyScore']=[{'fuzzyScore': 0, 'fuzzyMapping': 'UNKNOWN - ERROR', 'fuzzyIri': 'UNKNOWN - ERROR'}]
+                synCalculatedMappings['oxoScore']=[{'distance': 0, 'oxoCurie': 'UNKNOWN', 'oxoScore': 0}]
+                synCalculatedMappings['sourceIRI']=term["iri"]
 
-#Compares to ontologies from the OLS. This process can take a while and procudes a csv with primary results
-def scoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly):
-    logging.info("Start scoring "+sourceOntology+" and "+targetOntology)
+    else:
+        synCalculatedMappings['olsFuzzyScore']=[{'fuzzyScore': 0, 'fuzzyMapping': 'UNKNOWN', 'fuzzyIri': 'UNKNOWN'}]
+        synCalculatedMappings['oxoScore']=[{'distance': 0, 'oxoCurie': 'UNKNOWN', 'oxoScore': 0}]
+
+    return [originalLabel.encode(encoding='UTF-8'), term["iri"].encode(encoding='UTF-8'), calculatedMappings['olsFuzzyScore'], calculatedMappings['oxoScore'], synCalculatedMappings['olsFuzzyScore'], calculatedMappings['bridgeEvidence']]
+
+#OLS update date and versionIRI of the ontologies seen by prepareScoring
+ontologyVersions={}
+
+#Checks the urls, logs the versions of both ontologies and registers them for the api cache. With mapSmallest the smaller
+#ontology becomes the source. Returns the source and target ontology and the urls
+def prepareScoring(sourceOntology, targetOntology, mapSmallest):
     olsURL=config.get("Basics","olsAPIURL")
     oxoURL=config.get("Basics","oxoURL")
 
@@ -32,21 +89,27 @@ def scoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFo
     urls={"ols":olsURL, "oxo":oxoURL}
 
     try:
-        r = requests.get(olsURL+"ontologies/"+sourceOntology)
+        r = httpClient.get(olsURL+"ontologies/"+sourceOntology)
         numberOfTerms=r.json()['numberOfTerms']
         #Logging some meta data
         logging.info("MetaData for "+sourceOntology+": ")
         logging.info(" OLS update date: "+str(r.json()["updated"]))
         logging.info(" OLS version field: "+str(r.json()["config"]["version"]))
         logging.info(" OLS versionIRI field: "+str(r.json()["config"]["versionIri"]))
+        ontologyVersions[sourceOntology]=[r.json()["updated"], r.json()["config"]["versionIri"]]
+        if paxo_internals.cache!=None:
+            paxo_internals.cache.setOntologyVersion(sourceOntology, r.json()["updated"], r.json()["config"]["versionIri"])
 
-        r = requests.get(olsURL+"ontologies/"+targetOntology)
+        r = httpClient.get(olsURL+"ontologies/"+targetOntology)
         numberOfTerms2 = r.json()['numberOfTerms']
         #Logging some meta data
         logging.info("MetaData for "+targetOntology+": ")
         logging.info(" OLS update date: "+str(r.json()["updated"]))
         logging.info(" OLS version field: "+str(r.json()["config"]["version"]))
         logging.info(" OLS versionIRI field: "+str(r.json()["config"]["versionIri"]))
+        ontologyVersions[targetOntology]=[r.json()["updated"], r.json()["config"]["versionIri"]]
+        if paxo_internals.cache!=None:
+            paxo_internals.cache.setOntologyVersion(targetOntology, r.json()["updated"], r.json()["config"]["versionIri"])
 
     except:
         logging.error("Error getting number of terms throw webservice call!")
@@ -62,145 +125,346 @@ def scoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFo
             sourceOntology=targetOntology
             targetOntology=tmpOntology
 
-    termsUrl=olsURL+"ontologies/"+sourceOntology+"/terms?size=500&fieldList=iri,label,synonym"
-    results=[]
+    return sourceOntology, targetOntology, urls
+
+#Compares to ontologies from the OLS. This process can take a while and procudes a csv with primary results
+def scoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly, scoringWorkers=1, localFuzzyIndex=False, localIndexFolder=None, writeScoringCsv=True):
+    logging.info("Start scoring "+sourceOntology+" and "+targetOntology)
+    sourceOntology, targetOntology, urls=prepareScoring(sourceOntology, targetOntology, mapSmallest)
+    olsURL=urls["ols"]
+
+    #Offline mode, candidates for the fuzzy match are generated from a local index of the target ontology
+    if localFuzzyIndex==True:
+        paxo_internals.loadLocalIndex(targetOntology, olsURL, localIndexFolder)
 
-    results.append(["sourceLabel","sourceIRI", "fuzzy", "oxo", "synFuzzy", "bridgeTerms"])
+    termsUrl=olsURL+"ontologies/"+sourceOntology+"/terms?size=500&fieldList=iri,label,synonym"
     counter=0
+
+    #Rows are written to disc page by page, to the binary score file that -c and -cv read and optionally as csv export.
+    #The checkpoint file remembers the next page, so a restarted run continues there
+    scoreFileName=scoringtargetFolder+'scoring_output_'+sourceOntology+'_'+targetOntology+'.pscore'
+    outputFile=scoringtargetFolder+'scoring_output_'+sourceOntology+'_'+targetOntology+'.csv'
+    checkpointFile=scoreFileName+'.checkpoint'
+    #Hashes of the scored source terms, one json line per page, for the manifest written at the end
+    hashesFile=scoreFileName+'.hashes'
+    checkpoint=readCheckpoint(checkpointFile, sourceOntology, targetOntology)
+    f=None
+    exportCsv=False
+    if checkpoint!=None:
+        print "Found checkpoint, continue scoring "+sourceOntology+" "+targetOntology+" after page "+str(checkpoint['counter'])
+        logging.info("Found checkpoint, continue scoring after page "+str(checkpoint['counter'])+" with "+checkpoint['nextUrl'])
+        termsUrl=checkpoint['nextUrl']
+        counter=checkpoint['counter']
+        #Drop what was written after the last checkpoint
+        scoreWriter=scoreFile.ScoreFileWriter(scoreFileName, checkpoint['scoreOffset'])
+        hashes=None
+        if checkpoint.get('hashOffset')!=None and os.path.exists(hashesFile):
+            hashes=open(hashesFile, 'r+b')
+            hashes.truncate(checkpoint['hashOffset'])
+            hashes.seek(checkpoint['hashOffset'])
+        if writeScoringCsv==True:
+            if checkpoint['csvOffset']!=None and os.path.exists(outputFile):
+                f=open(outputFile, 'r+b')
+                f.truncate(checkpoint['csvOffset'])
+                f.seek(checkpoint['csvOffset'])
+                writer=csv.writer(f)
+            else:
+                #The interrupted run did not write the csv, it is exported from the score file at the end
+                logging.info("No csv of the interrupted run, export "+outputFile+" from the score file when done")
+                exportCsv=True
+    else:
+        scoreWriter=scoreFile.ScoreFileWriter(scoreFileName)
+        hashes=open(hashesFile, 'wb')
+        if writeScoringCsv==True:
+            f=open(outputFile, 'wb')
+            writer=csv.writer(f)
+            writer.writerow(["sourceLabel","sourceIRI", "fuzzy", "oxo", "synFuzzy", "bridgeTerms"])
+
+    #Bounded pool of workers for the terms of a page, with only one worker the terms are scored one after another
+    pool=None
+    if scoringWorkers>1:
+        logging.info("Score terms with "+str(scoringWorkers)+" workers")
+        pool=ThreadPool(scoringWorkers)
+
     while True:
         try:
-            r = requests.get(termsUrl)
+            r = httpClient.get(termsUrl)
         except Exception as e:
             print "Error with webservice call"
             print e
             logging.info("Error with webservice call")
-            logging.info(r.url)
-            logging.info(r.status_code)
+            logging.info(termsUrl)
             raise e
 
-        for term in r.json()['_embedded']['terms']:
-            originalLabel=term["label"]
-            synonyms=term["synonyms"]
-
-            #Check if the term is actually defined in that ontology. Via flag it can be changed to process all terms
-            if term['is_defining_ontology'] is True or term['is_defining_ontology'] is useLocalOnly:
-                pscore=paxo_internals.scoreTermOLS(term["iri"], originalLabel, targetOntology, scoreParams, urls)
-                try:
-                    calculatedMappings=paxo_internals.processPScore(pscore)
-                except Exception as e:
-                    print "Exception in primary Scoring"
-                    print e
-                    print term["iri"]
-                    print originalLabel
-                    print targetOntology
-                    logging.info("Exception in primary Scoring")
-                    logging.info(term["iri"]+" "+originalLabel)
-                    calculatedMappings={'sourceTerm':term["iri"]+"ERROR", "olsFuzzyScore": [], "oxoScore": [], "bridgeEvidence": []}
-
-                #If synonyms are available, run through the same steps with synonyms to score an ontology
-                synCalculatedMappings={}
-                if synonyms!=None:
-                    for synonym in synonyms:
-                        try:
-                            synPscore=paxo_internals.primaryScoreTerm('', synonym, targetOntology, scoreParams, urls)
-                            synCalculatedMappings=paxo_internals.processPScore(synPscore)         #Process the primaryScore for synonyms
-                            synCalculatedMappings['sourceIRI']=term["iri"]
-                        except Exception as e:
-                            print "Exception in Synonym processPScore Term"
-                            print e
-                            synCalculatedMappings={'sourceTerm':term["iri"]+"ERROR", "olsFuzzyScore": [], "oxoScore": [], "bridgeEvidence": []}
-                            logging.info("Exception in  Synonym processPScore Term")
-                            logging.info(term["iri"]+" "+synonym+" "+targetOntology)
-                            synCalculatedMappings['olsFuzzyScore']=[{'fuzzyScore': 0, 'fuzzyMapping': 'UNKNOWN - ERROR', 'fuzzyIri': 'UNKNOWN - ERROR'}]
-                            synCalculatedMappings['oxoScore']=[{'distance': 0, 'oxoCurie': 'UNKNOWN', 'oxoScore': 0}]
-                            synCalculatedMappings['sourceIRI']=term["iri"]
-
-                else:
-                    synCalculatedMappings['olsFuzzyScore']=[{'fuzzyScore': 0, 'fuzzyMapping': 'UNKNOWN', 'fuzzyIri': 'UNKNOWN'}]
-                    synCalculatedMappings['oxoScore']=[{'distance': 0, 'oxoCurie': 'UNKNOWN', 'oxoScore': 0}]
-
-                results.append([originalLabel.encode(encoding='UTF-8'), term["iri"].encode(encoding='UTF-8'), calculatedMappings['olsFuzzyScore'], calculatedMappings['oxoScore'], synCalculatedMappings['olsFuzzyScore'], calculatedMappings['bridgeEvidence']])
+        #Score the terms of this page, with scoringWorkers>1 the terms are processed by a pool of threads. map keeps the order of the page
+        terms=r.json()['_embedded']['terms']
+        scoreTerm=functools.partial(scoreOntologyTerm, targetOntology=targetOntology, scoreParams=scoreParams, urls=urls, useLocalOnly=useLocalOnly)
+        if pool!=None:
+            rows=pool.map(scoreTerm, terms)
+        else:
+            rows=map(scoreTerm, terms)
+
+        rows=[row for row in rows if row!=None]
+        scoreWriter.writeChunk(rows)
+        scoreWriter.flush()
+        os.fsync(scoreWriter.fileno())
+        csvOffset=None
+        if f!=None:
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+            csvOffset=f.tell()
+        hashOffset=None
+        if hashes!=None:
+            hashes.write(json.dumps(termHashes(terms))+"\n")
+            hashes.flush()
+            os.fsync(hashes.fileno())
+            hashOffset=hashes.tell()
+
+        #Only a missing next link ends the loop, a failing checkpoint must not look like the last page
         try:
             termsUrl=r.json()['_links']['next']['href']
-            counter=counter+1
-            if counter%2==0:
-                print "Processed "+str(counter)+" pages"
-                logging.info("Processed "+str(counter)+" pages")
-                #break  #Uncomment this for testing the -s flag (so not the whole ontology is parsed but 2 pages)
-        except:
+        except KeyError:
             logging.info("Reached last page I recon")
             print "Reached last page I recon"
             break
+        counter=counter+1
+        writeCheckpoint(checkpointFile, {"source":sourceOntology, "target":targetOntology, "nextUrl":termsUrl, "counter":counter, "scoreOffset":scoreWriter.tell(), "csvOffset":csvOffset, "hashOffset":hashOffset})
+        if counter%2==0:
+            print "Processed "+str(counter)+" pages"
+            logging.info("Processed "+str(counter)+" pages")
+            logging.info(paxo_internals.labelCache.stats())
+            #break  #Uncomment this for testing the -s flag (so not the whole ontology is parsed but 2 pages)
+
+    if pool!=None:
+        pool.close()
+        pool.join()
+
+    scoreWriter.close()
+    if f!=None:
+        f.close()
+    if exportCsv==True:
+        exportPrimaryScoreCsv(sourceOntology+'_'+targetOntology, scoringtargetFolder)
+    #The scoring output is complete, a new run starts from the first page again
+    if os.path.exists(checkpointFile):
+        os.remove(checkpointFile)
+
+    #Manifest of the terms of both ontologies, the base of the next incremental run (-si). The source hashes come from
+    #the scored pages, only a checkpoint of an older version without hashes needs another walk over the source terms
+    if hashes!=None:
+        hashes.close()
+        sourceHashes={}
+        with open(hashesFile) as hashes:
+            for line in hashes:
+                sourceHashes.update(json.loads(line))
+    else:
+        sourceHashes=termHashes(readOntologyTerms(sourceOntology, olsURL))
+    manifestFile=scoringtargetFolder+'scoring_output_'+sourceOntology+'_'+targetOntology+'.manifest'
+    targetHashes=targetTermHashes(targetOntology, olsURL, readManifest(manifestFile, sourceOntology, targetOntology))
+    writeManifest(manifestFile, sourceOntology, targetOntology, sourceHashes, targetHashes)
+    if os.path.exists(hashesFile):
+        os.remove(hashesFile)
+
+    paxo_internals.logLabelCacheStats()
+
+#Rescores only the terms that changed since the last run. The manifest of the last run holds a hash of label, synonyms and flags per IRI
+#of the source and the target ontology. Added and changed source terms are scored, removed ones are dropped and the rows of unchanged terms
+#are taken from the existing score file. Terms whose previous candidates point at changed or removed target terms are scored again as well.
+#New target terms are not looked for in the rows of unchanged source terms, a full run with -s covers those
+def rescoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly, scoringWorkers=1, localFuzzyIndex=False, localIndexFolder=None, writeScoringCsv=True):
+    logging.info("Start incremental scoring "+sourceOntology+" and "+targetOntology)
+    arguments=(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly, scoringWorkers, localFuzzyIndex, localIndexFolder, writeScoringCsv)
+    sourceOntology, targetOntology, urls=prepareScoring(sourceOntology, targetOntology, mapSmallest)
+    olsURL=urls["ols"]
+
+    name=sourceOntology+'_'+targetOntology
+    scoreFileName=scoringtargetFolder+'scoring_output_'+name+'.pscore'
+    outputFile=scoringtargetFolder+'scoring_output_'+name+'.csv'
+    manifestFile=scoringtargetFolder+'scoring_output_'+name+'.manifest'
+    manifest=readManifest(manifestFile, sourceOntology, targetOntology)
+    #Without a complete previous run there is nothing to compare with
+    if manifest==None or os.path.exists(scoreFileName)==False or os.path.exists(scoreFileName+'.checkpoint'):
+        print "No complete previous run with a manifest for "+name+", score all terms"
+        logging.info("No complete previous run with a manifest for "+name+", score all terms")
+        scoreOntologies(*arguments)
+        return
+
+    if localFuzzyIndex==True:
+        paxo_internals.loadLocalIndex(targetOntology, olsURL, localIndexFolder)
+
+    sourceTerms=readOntologyTerms(sourceOntology, olsURL)
+    sourceHashes=termHashes(sourceTerms)
+    targetHashes=targetTermHashes(targetOntology, olsURL, manifest)
+    changedTargets=set(iri for iri, termHash in manifest['targetTerms'].items() if targetHashes.get(iri)!=termHash)
+
+    oldRows={}
+    for row in readPrimaryScoreRows(name, scoringtargetFolder):
+        oldRows[row[1].decode('utf-8')]=row
+
+    #Decide per term, in the order of the OLS pages: keep the old row (None for skipped terms) or score again
+    work=[]
+    for term in sourceTerms:
+        oldRow=oldRows.get(term["iri"])
+        if manifest['sourceTerms'].get(term["iri"])!=sourceHashes[term["iri"]]:
+            work.append((term, None, True))
+        elif oldRow!=None and len(candidateIris(oldRow) & changedTargets)>0:
+            work.append((term, None, True))
+        else:
+            work.append((term, oldRow, False))
+    rescore=len([item for item in work if item[2]==True])
+    removed=len(set(oldRows.keys())-set(sourceHashes.keys()))
+    msg="Incremental scoring of "+name+": "+str(rescore)+" terms to score, "+str(len(work)-rescore)+" unchanged, "+str(removed)+" removed, "+str(len(changedTargets))+" changed target terms"
+    print msg
+    logging.info(msg)
+
+    pool=None
+    if scoringWorkers>1:
+        pool=ThreadPool(scoringWorkers)
+    scoreTerm=functools.partial(scoreOntologyTerm, targetOntology=targetOntology, scoreParams=scoreParams, urls=urls, useLocalOnly=useLocalOnly)
+
+    #The new output is written next to the old one and replaces it when complete
+    scoreWriter=scoreFile.ScoreFileWriter(scoreFileName+'.tmp')
+    f=None
+    if writeScoringCsv==True:
+        f=open(outputFile+'.tmp', 'wb')
+        writer=csv.writer(f)
+        writer.writerow(["sourceLabel","sourceIRI", "fuzzy", "oxo", "synFuzzy", "bridgeTerms"])
+
+    for start in range(0, len(work), 500):
+        page=work[start:start+500]
+        terms=[term for term, oldRow, scoreAgain in page if scoreAgain==True]
+        if pool!=None:
+            scored=iter(pool.map(scoreTerm, terms))
+        else:
+            scored=iter(map(scoreTerm, terms))
+        rows=[]
+        for term, oldRow, scoreAgain in page:
+            if scoreAgain==True:
+                oldRow=next(scored)
+            if oldRow!=None:
+                rows.append(oldRow)
+        scoreWriter.writeChunk(rows)
+        if f!=None:
+            writer.writerows(rows)
+
+    if pool!=None:
+        pool.close()
+        pool.join()
+    scoreWriter.close()
+    os.rename(scoreFileName+'.tmp', scoreFileName)
+    if f!=None:
+        f.close()
+        os.rename(outputFile+'.tmp', outputFile)
+
+    writeManifest(manifestFile, sourceOntology, targetOntology, sourceHashes, targetHashes)
+    paxo_internals.logLabelCacheStats()
 
+#IRIs of the fuzzy, oxo, synonym and bridge candidates of a row of the primary score
+def candidateIris(row):
+    label, iri, fuzzy, oxo, synFuzzy, bridge=row
+    return set([entry['fuzzyIri'] for entry in fuzzy+synFuzzy]+[entry['oxoCurie'] for entry in oxo+bridge])
 
-    with open(scoringtargetFolder+'scoring_output_'+sourceOntology+'_'+targetOntology+'.csv', 'w') as f:
+#Reads all pages of the terms of an ontology
+def readOntologyTerms(ontology, olsURL):
+    termsUrl=olsURL+"ontologies/"+ontology+"/terms?size=500&fieldList=iri,label,synonym"
+    terms=[]
+    while True:
+        r = httpClient.get(termsUrl)
+        terms.extend(r.json()['_embedded']['terms'])
+        try:
+            termsUrl=r.json()['_links']['next']['href']
+        except KeyError:
+            break
+    return terms
+
+#Hash of what the scoring of a term depends on
+def termHash(term):
+    return hashlib.sha1(json.dumps([term.get("label"), term.get("synonyms"), term.get("is_defining_ontology"), term.get("is_obsolete", False)])).hexdigest()
+
+def termHashes(terms):
+    hashes={}
+    for term in terms:
+        hashes[term["iri"]]=termHash(term)
+    return hashes
+
+#Hashes of the target terms of target ontologies, per version, so sections with the same target walk its terms once per process
+targetHashCache={}
+
+#Hashes of the terms of the target ontology. Taken from the manifest of the last run if OLS still has the same version of the
+#target, otherwise all its terms are read (once per version and process)
+def targetTermHashes(targetOntology, olsURL, manifest):
+    version=ontologyVersions.get(targetOntology)
+    if manifest!=None and version!=None and manifest.get('targetVersion')==version:
+        return manifest['targetTerms']
+    key=(targetOntology, json.dumps(version))
+    if key not in targetHashCache:
+        targetHashCache[key]=termHashes(readOntologyTerms(targetOntology, olsURL))
+    return targetHashCache[key]
+
+#Returns the manifest of the last complete scoring run of this pair of ontologies, or None
+def readManifest(manifestFile, sourceOntology, targetOntology):
+    if os.path.exists(manifestFile)==False:
+        return None
+    with open(manifestFile) as f:
+        manifest=json.load(f)
+    if manifest['source']!=sourceOntology or manifest['target']!=targetOntology:
+        return None
+    return manifest
+
+def writeManifest(manifestFile, sourceOntology, targetOntology, sourceHashes, targetHashes):
+    with open(manifestFile+'.tmp', 'w') as f:
+        json.dump({"source":sourceOntology, "target":targetOntology, "sourceTerms":sourceHashes, "targetTerms":targetHashes, "targetVersion":ontologyVersions.get(targetOntology)}, f)
+    os.rename(manifestFile+'.tmp', manifestFile)
+
+#Returns the checkpoint of an unfinished scoring run of this pair of ontologies, or None
+def readCheckpoint(checkpointFile, sourceOntology, targetOntology):
+    if os.path.exists(checkpointFile)==False:
+        return None
+    with open(checkpointFile) as f:
+        checkpoint=json.load(f)
+    if checkpoint['source']!=sourceOntology or checkpoint['target']!=targetOntology:
+        logging.info("Checkpoint "+checkpointFile+" is for a different pair of ontologies, ignore it")
+        return None
+    return checkpoint
+
+#Written to a temporary file first, so a crash while writing does not leave a broken checkpoint
+def writeCheckpoint(checkpointFile, checkpoint):
+    with open(checkpointFile+'.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(checkpointFile+'.tmp', checkpointFile)
+
+#Yields the rows of the primary score as (sourceLabel, sourceIRI, fuzzy, oxo, synFuzzy, bridgeEvidence). Reads the binary
+#score file, if there is none (scored with an older version) the csv file is parsed instead
+def readPrimaryScoreRows(name, scorefolder):
+    scoreFileName=scorefolder+"scoring_output_"+name+".pscore"
+    if os.path.exists(scoreFileName):
+        for row in scoreFile.readScoreFile(scoreFileName):
+            yield row
+    else:
+        with open(scorefolder+"scoring_output_"+name+".csv") as csvfile:
+            readCSV = csv.reader(csvfile, delimiter=',')
+            next(readCSV)   #Skip csv header
+            for row in readCSV:
+                yield (row[0], row[1], ast.literal_eval(row[2]), ast.literal_eval(row[3]), ast.literal_eval(row[4]), ast.literal_eval(row[5]))
+
+#Converts a binary score file back to the scoring csv
+def exportPrimaryScoreCsv(name, scorefolder):
+    with open(scorefolder+"scoring_output_"+name+".csv", 'wb') as f:
         writer = csv.writer(f)
-        writer.writerows(results)
-        f.close()
+        writer.writerow(["sourceLabel","sourceIRI", "fuzzy", "oxo", "synFuzzy", "bridgeTerms"])
+        for row in scoreFile.readScoreFile(scorefolder+"scoring_output_"+name+".pscore"):
+            writer.writerow(row)
 
-#Read in and process the ontology primary score from a csv file
+#Read in and process the ontology primary score from the score file
 def scoreOntologyPrimaryScore(name, scorefolder):
+    return paxo_internals.simplifyPrimaryScoreRows(readPrimaryScoreRows(name, scorefolder))
 
-    with open(scorefolder+"scoring_output_"+name+".csv") as csvfile:
-        readCSV = csv.reader(csvfile, delimiter=',')
-
-        scoreMatrix=[]
-        next(readCSV)   #Skip csv header
-        for row in readCSV:
-            originalLabel=row[0]
-            orginaliri=row[1]
-            tmp=row[2]
-            fuzzy=ast.literal_eval(tmp)
-            tmp=row[3]
-            oxo=ast.literal_eval(tmp)
-            tmp=row[4]
-            synFuzzy=ast.literal_eval(tmp)
-            tmp=row[5]
-            bridgeEvidence=ast.literal_eval(tmp)
-
-            for i in fuzzy:
-                #obj={"sourceTerm":originalLabel, "sourceIRI":orginaliri ,"iri": i['fuzzyIri'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "synOxo":synOxo, "bridgeEvidence":bridgeEvidence}
-                obj={"sourceTerm":originalLabel, "sourceIRI":orginaliri ,"iri": i['fuzzyIri'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "bridgeEvidence":bridgeEvidence}
-                scoreMatrix.append(obj)
-
-            for i in oxo:
-                obj={"sourceTerm":originalLabel, "sourceIRI":orginaliri, "iri": i['oxoCurie'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy,  "bridgeEvidence":bridgeEvidence}
-                scoreMatrix.append(obj)
-
-            for i in synFuzzy:
-                obj={"sourceTerm":originalLabel, "sourceIRI":orginaliri, "iri": i['fuzzyIri'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "bridgeEvidence":bridgeEvidence}
-                scoreMatrix.append(obj)
-
-            for i in bridgeEvidence:
-                obj={"sourceTerm":originalLabel, "sourceIRI":orginaliri, "iri": i['oxoCurie'], "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "bridgeEvidence":bridgeEvidence}
-                scoreMatrix.append(obj)
-
-
-        simplerMatrix=[]
-        #Calls simplifyProcessedPscore for ever line in scoreMatrix that we just read in
-        for line in scoreMatrix:
-            pScore=paxo_internals.simplifyProcessedPscore(line)
-            if pScore not in simplerMatrix:
-                simplerMatrix.append(pScore)
-
-        return simplerMatrix
-
-#Takes simplified input and actually calculates the finale score
-def processOntologyPrimaryScore(pScore, params):
-    result=[]
-    for line in pScore:
-        singleLineResult=paxo_internals.scoreSimple(line, params)
-        result.append(singleLineResult)
-
-    #Take the highest scored mappings
-    tmp=[]
-    for entry in result:
-        if entry!=[]:
-            tmp.append(entry)
-
-    #SortScore
-    tmp=sorted(tmp, key=lambda tmp:tmp[0]['finaleScore'], reverse=True)
-    return tmp
+#Takes the simplified input in columns (scoreKernel.ScoreColumns) and actually calculates the finale score.
+#Returns the best scored mapping of every source term, highest scores first
+def processOntologyPrimaryScore(columns, params):
+    return scoreKernel.scoreColumns(columns, params)
 
 #Maybe transfer to server
 def scoreTermList(termList, targetOntology, scoreParams, params):
@@ -234,35 +498,17 @@ def writeOutPutScore(scoredMatrix, name, predictedTargetFolder, saveToDisc):
 
     return result
 
-#Not implemented yet #Remove double entry stuff #Potentially
+#Remove double entries, only the best scored mapping of every target (or source, or source and target, see uniqueMapsPolicy) is kept
 def curationOntologyFinalScore(scoredMatrix):
-    endmap=[]
-    unified=[]
-    doubleEntryCounter=0
-    replacedList=[]
-    for counter, line in enumerate(scoredMatrix):
-        if line[1] not in endmap:
-            endmap.append(line[1])
-            unified.append(line)
-        else:
-            doubleEntryCounter=doubleEntryCounter+1
-            index=endmap.index(line[1])
-
-            #Found higher score, so replace the lower!
-            if unified[index][2]<scoredMatrix[counter][2]:
-                unified[index]=scoredMatrix[counter] #Replace that line with the higher scored line!
-
-    #print "A total of "+str(doubleEntryCounter)+" processed!"
-    #if len(replacedList)!=0:
-        #print "Write file of replaced terms now"
-        #print "Total length of replaced is "+str(len(replacedList))
-    return unified
-
-
+    return paxo_internals.uniqueMappings(scoredMatrix, uniqueMapsPolicy)
 
 def calculatePrimaryScore(combinedOntologyName, params, scoringTargetFolder, writeToDisc, predictedTargetFolder, curationOfDoubleEntries):
-    simplerMatrix=scoreOntologyPrimaryScore(combinedOntologyName, scoringTargetFolder)
-    scoredMatrix=processOntologyPrimaryScore(simplerMatrix, params)
+    columns=scoreKernel.ScoreColumns(scoreOntologyPrimaryScore(combinedOntologyName, scoringTargetFolder))
+    return scoreSimplifiedMatrix(columns, combinedOntologyName, params, writeToDisc, predictedTargetFolder, curationOfDoubleEntries)
+
+#Calculates the finale score of the already simplified primary score, given in columns
+def scoreSimplifiedMatrix(columns, combinedOntologyName, params, writeToDisc, predictedTargetFolder, curationOfDoubleEntries):
+    scoredMatrix=processOntologyPrimaryScore(columns, params)
 
     #Maximum would be caluclated like that, anyway, who knows if we really want that
     #maximum=(4*params["fuzzyUpperFactor"]+params["oxoDistanceOne"]+params["oxoDistanceOne"]*params["bridgeOxoFactor"])/4.0
@@ -284,25 +530,82 @@ def calculateAndValidateOntologyPrimaryScore(onto1, onto2, stdName, stdFile, par
     validationResult=validation.validateFinaleScore(onto1, onto2, stdName, preparedScoredMatrix, stdFile, writeToDisc, params, parseParms, validationTargetFolder, url)
     return validationResult
 
+#Reads the optional parameters of the offline fuzzy mode from the Params section
+def readLocalIndexParams():
+    localFuzzyIndex=False
+    localIndexFolder=None
+    if config.has_option("Params", 'localFuzzyIndex'):
+        localFuzzyIndex=config.getboolean("Params", 'localFuzzyIndex')
+    if config.has_option("Params", 'localIndexFolder'):
+        localIndexFolder=config.get("Params", 'localIndexFolder')
+        if os.path.exists(localIndexFolder)==False:
+            print "Could not find "+localIndexFolder+" - please make sure the folder exists!\n"
+            raise Exception("Folder does not exists")
+    return localFuzzyIndex, localIndexFolder
+
 #Goes through the sections and calls scoreOntologies for every section
-def scoreListOntologies(sections):
+def scoreListOntologies(sections, incremental=False):
     scoringtargetFolder=config.get('Params', 'scoringTargetFolder')
     if os.path.exists(scoringtargetFolder)==False:
         print "Could not find "+scoringtargetFolder+" - please make sure the folder exists!\n"
         raise Exception("Folder does not exists")
 
+    runSections("score", sections, (incremental,))
+
+#Scores the pair of ontologies of one section, only the changed terms if incremental is True
+def scoreSection(section, incremental=False):
+    scoringtargetFolder=config.get('Params', 'scoringTargetFolder')
+    sourceOntology=config.get(section, 'sourceOntology')
+    targetOntology=config.get(section, 'targetOntology')
+    stopwordList=config.get("Params","StopwordsList").split(',')
+
+    mapSmallest=config.getboolean("Params", 'mapSmallest')
+    useLocalOnly=config.getboolean("Params", 'useLocalOnly')
+    scoringWorkers=1
+    if config.has_option("Params", 'scoringWorkers'):
+        scoringWorkers=config.getint("Params", 'scoringWorkers')
+    localFuzzyIndex, localIndexFolder=readLocalIndexParams()
+    writeScoringCsv=True
+    if config.has_option("Params", 'writeScoringCsv'):
+        writeScoringCsv=config.getboolean("Params", 'writeScoringCsv')
+
+    scoreParams={"removeStopwordsList":stopwordList, "replaceTermList" : []}
+    print "Score "+sourceOntology+" "+targetOntology
+    logging.info("Score "+sourceOntology+" "+targetOntology)
+    if incremental==True:
+        rescoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly, scoringWorkers, localFuzzyIndex, localIndexFolder, writeScoringCsv)
+    else:
+        scoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly, scoringWorkers, localFuzzyIndex, localIndexFolder, writeScoringCsv)
+
+#Goes through the sections and writes the scoring csv from the binary score file for every section
+def exportScoreList(sections):
+    scoringTargetFolder=config.get('Params','scoringTargetFolder')
     for section in sections:
         sourceOntology=config.get(section, 'sourceOntology')
         targetOntology=config.get(section, 'targetOntology')
-        stopwordList=config.get("Params","StopwordsList").split(',')
-
-        mapSmallest=config.getboolean("Params", 'mapSmallest')
-        useLocalOnly=config.getboolean("Params", 'useLocalOnly')
-
-        scoreParams={"removeStopwordsList":stopwordList, "replaceTermList" : []}
-        print "Score "+sourceOntology+" "+targetOntology
-        logging.info("Score "+sourceOntology+" "+targetOntology)
-        scoreOntologies(sourceOntology, targetOntology, scoreParams, scoringtargetFolder, mapSmallest, useLocalOnly)
+        print "Export scoring csv of "+sourceOntology+" "+targetOntology
+        exportPrimaryScoreCsv(sourceOntology+"_"+targetOntology, scoringTargetFolder)
+
+#Names of the parameters of the finale score, read from the mapping sections and varied by the parameter sweep
+scoreParamNames=["fuzzyUpperLimit", "fuzzyLowerLimit", "fuzzyUpperFactor", "fuzzyLowerFactor", "oxoDistanceOne", "oxoDistanceTwo", "oxoDistanceThree", "synFuzzyFactor", "bridgeOxoFactor", "threshold"]
+
+#Reads the parameters of the finale score of a mapping section
+def readSectionParams(section):
+    params={}
+    for name in scoreParamNames:
+        params[name]=float(config.get(section, name))
+    return params
+
+#Reads the parameters of a standard of a mapping section
+def readParseParms(section, name):
+    uri1=int(config.get(section, 'uri1'+name))
+    uri2=int(config.get(section, 'uri2'+name))
+    scorePosition=int(config.get(section, 'scorePosition'+name))
+    delimiter=config.get(section, 'delimiter'+name)
+    if delimiter=='t':
+        #print "Have to change delimiter!"
+        delimiter=str('\t')
+    return {'uri1':uri1, 'uri2':uri2, 'scorePosition':scorePosition, 'delimiter':delimiter}
 
 #Goes through the sections and calls calculateAndValidateOntologyPrimaryScore for every section
 def calculateAndValidateListOntologies(sections, writeToDiscFlag, curationOfDoubleEntries):
@@ -328,28 +631,9 @@ def calculateAndValidateListOntologies(sections, writeToDiscFlag, curationOfDoub
 
         for name in stdNames:
             stdFile=config.get(section, name)
-            uri1=int(config.get(section, 'uri1'+name))
-            uri2=int(config.get(section, 'uri2'+name))
-            scorePosition=int(config.get(section, 'scorePosition'+name))
-            delimiter=config.get(section, 'delimiter'+name)
-            if delimiter=='t':
-                #print "Have to change delimiter!"
-                delimiter=str('\t')
-
-            parseParms={'uri1':uri1, 'uri2':uri2, 'scorePosition':scorePosition, 'delimiter':delimiter}
-
-            fuzzyUpperLimit=float(config.get(section,'fuzzyUpperLimit'))
-            fuzzyLowerLimit=float(config.get(section,'fuzzyLowerLimit'))
-            fuzzyUpperFactor=float(config.get(section,'fuzzyUpperFactor'))
-            fuzzyLowerFactor=float(config.get(section,'fuzzyLowerFactor'))
-            oxoDistanceOne=float(config.get(section,'oxoDistanceOne'))
-            oxoDistanceTwo=float(config.get(section,'oxoDistanceTwo'))
-            oxoDistanceThree=float(config.get(section,'oxoDistanceThree'))
-            synFuzzyFactor=float(config.get(section,'synFuzzyFactor'))
-            bridgeOxoFactor=float(config.get(section,'bridgeOxoFactor'))
-            threshold=float(config.get(section,'threshold'))
-            #params={"fuzzyUpperLimit": fuzzyUpperLimit, "fuzzyLowerLimit": fuzzyLowerLimit,"fuzzyUpperFactor": fuzzyUpperFactor,"fuzzyLowerFactor":fuzzyLowerFactor, "oxoDistanceOne":oxoDistanceOne, "oxoDistanceTwo":oxoDistanceTwo, "oxoDistanceThree":oxoDistanceThree, "synFuzzyFactor":synFuzzyFactor, "synOxoFactor": synOxoFactor, "bridgeOxoFactor":bridgeOxoFactor, "threshold":threshold}
-            params={"fuzzyUpperLimit": fuzzyUpperLimit, "fuzzyLowerLimit": fuzzyLowerLimit,"fuzzyUpperFactor": fuzzyUpperFactor,"fuzzyLowerFactor":fuzzyLowerFactor, "oxoDistanceOne":oxoDistanceOne, "oxoDistanceTwo":oxoDistanceTwo, "oxoDistanceThree":oxoDistanceThree, "synFuzzyFactor":synFuzzyFactor, "bridgeOxoFactor":bridgeOxoFactor, "threshold":threshold}
+            parseParms=readParseParms(section, name)
+
+            params=readSectionParams(section)
 
             #print "Validate "+sourceOntology+" "+targetOntology+" "+name
             returnCV=calculateAndValidateOntologyPrimaryScore(sourceOntology, targetOntology, name, stdFile, params, scoringtargetFolder, writeToDiscFlag, predictedTargetFolder, parseParms, curationOfDoubleEntries,validationTargetFolder,config.get('Basics','olsAPIURL')+"search")
@@ -359,6 +643,118 @@ def calculateAndValidateListOntologies(sections, writeToDiscFlag, curationOfDoub
 
     return returnValue
 
+#Parameter sets of the sweep, based on the parameters of a mapping section. Every parameter with a sweep option in Params
+#(e.g. sweepThreshold=0.6,0.8,1.0) is varied. In grid mode all combinations of the given values are evaluated, in random mode
+#sweepSamples sets are drawn between the smallest and the largest given value of each parameter
+def readSweepParameterSets(baseParams):
+    names=[]
+    sweepValues=[]
+    for name in scoreParamNames:
+        option="sweep"+name[0].upper()+name[1:]
+        if config.has_option("Params", option):
+            names.append(name)
+            sweepValues.append([float(value) for value in config.get("Params", option).split(',')])
+
+    sweepMode="grid"
+    if config.has_option("Params", 'sweepMode'):
+        sweepMode=config.get("Params", 'sweepMode')
+
+    parameterSets=[]
+    if sweepMode=="grid":
+        for values in itertools.product(*sweepValues):
+            params=dict(baseParams)
+            params.update(zip(names, values))
+            parameterSets.append(params)
+    elif sweepMode=="random":
+        sweepSamples=100
+        sweepSeed=42
+        if config.has_option("Params", 'sweepSamples'):
+            sweepSamples=config.getint("Params", 'sweepSamples')
+        if config.has_option("Params", 'sweepSeed'):
+            sweepSeed=config.getint("Params", 'sweepSeed')
+        rnd=random.Random(sweepSeed)
+        for i in range(sweepSamples):
+            params=dict(baseParams)
+            for name, values in zip(names, sweepValues):
+                params[name]=round(rnd.uniform(min(values), max(values)), 4)
+            parameterSets.append(params)
+    else:
+        print "Unknown sweepMode "+sweepMode+", use grid or random"
+        raise Exception("Unknown sweepMode")
+    return names, parameterSets
+
+#Simplified primary score and standard of the running sweep. Set before the worker processes are forked, so they are not sent to every worker
+sweepData={}
+
+#Scores the simplified primary score with one parameter set and compares the result with the standard
+def evaluateParameterSet(params):
+    preparedScoredMatrix=scoreSimplifiedMatrix(sweepData['columns'], sweepData['name'], params, False, None, sweepData['curationOfDoubleEntries'])
+    matches, missing, alternatives, alternativeCounter=validation.compareWithStandard(preparedScoredMatrix, sweepData['targetList'], sweepData['targetLongList'], sweepData['scorePosition'])
+
+    precision=0.0
+    if len(matches)+len(alternatives)>0:
+        precision=len(matches)*1.0/(len(matches)+len(alternatives))
+    recall=0.0
+    if len(sweepData['targetList'])>0:
+        recall=len(matches)*1.0/len(sweepData['targetList'])
+    f1=0.0
+    if precision+recall>0:
+        f1=2*precision*recall/(precision+recall)
+    return [len(preparedScoredMatrix), len(matches), len(missing), len(alternatives), round(precision, 4), round(recall, 4), round(f1, 4)]
+
+#Goes through the sections and validates many parameter sets for every standard. The primary score of a section is read and simplified once,
+#the parameter sets are evaluated in parallel processes. Writes one row with precision and recall per parameter set
+def sweepListOntologies(sections, curationOfDoubleEntries):
+    validationTargetFolder=config.get('Params', 'validationTargetFolder')
+    scoringtargetFolder=config.get('Params', 'scoringTargetFolder')
+    if os.path.exists(scoringtargetFolder)==False:
+        print "Could not find "+scoringtargetFolder+" - please make sure the folder exists!\n"
+        raise Exception("Folder does not exists")
+    if os.path.exists(validationTargetFolder)==False:
+        print "Could not find "+validationTargetFolder+" - please make sure the folder exists!\n"
+        raise Exception("Folder does not exists")
+
+    sweepWorkers=multiprocessing.cpu_count()
+    if config.has_option("Params", 'sweepWorkers'):
+        sweepWorkers=config.getint("Params", 'sweepWorkers')
+
+    for section in sections:
+        sourceOntology=config.get(section, 'sourceOntology')
+        targetOntology=config.get(section, 'targetOntology')
+        combinedOntologyName=sourceOntology+"_"+targetOntology
+        names, parameterSets=readSweepParameterSets(readSectionParams(section))
+        print "Sweep "+combinedOntologyName+" with "+str(len(parameterSets))+" parameter sets"
+        logging.info("Sweep "+combinedOntologyName+" with "+str(len(parameterSets))+" parameter sets")
+
+        sweepData['name']=combinedOntologyName
+        sweepData['curationOfDoubleEntries']=curationOfDoubleEntries
+        sweepData['columns']=scoreKernel.ScoreColumns(scoreOntologyPrimaryScore(combinedOntologyName, scoringtargetFolder))
+
+        for name in config.get(section, 'standard').split(','):
+            parseParms=readParseParms(section, name)
+            sweepData['targetList'], sweepData['targetLongList']=validation.readStandard(config.get(section, name), parseParms)
+            sweepData['scorePosition']=parseParms['scorePosition']
+
+            pool=multiprocessing.Pool(sweepWorkers)
+            try:
+                results=pool.map(evaluateParameterSet, parameterSets, max(1, len(parameterSets)/(4*sweepWorkers)))
+            finally:
+                pool.close()
+                pool.join()
+
+            rows=[]
+            for params, result in zip(parameterSets, results):
+                rows.append([params[paramName] for paramName in scoreParamNames]+result)
+            with open(validationTargetFolder+combinedOntologyName+'_'+name+'_sweep.csv', 'wb') as f:
+                writer = csv.writer(f)
+                writer.writerow(scoreParamNames+['predicted', 'matches', 'misses', 'alternatives', 'precision', 'recall', 'f1'])
+                writer.writerows(rows)
+
+            best=max(rows, key=lambda row:row[-1])
+            msg="Best parameter set for "+combinedOntologyName+" "+name+" (f1 "+str(best[-1])+"): "+", ".join(paramName+"="+str(best[i]) for i, paramName in enumerate(scoreParamNames) if paramName in names)
+            print msg
+            logging.info(msg)
+
 #Goes through the sections and calls calculateOntologyPrimaryScore for every section
 def calculateListOntologies(sections, writeToDisc, curationOfDoubleEntries):
     scoringTargetFolder=config.get('Params','scoringTargetFolder')
@@ -372,51 +768,154 @@ def calculateListOntologies(sections, writeToDisc, curationOfDoubleEntries):
         print "Could not find "+predictedTargetFolder+" - please make sure the folder exists!\n"
         raise Exception("Folder does not exists")
 
-    for section in sections:
-        sourceOntology=config.get(section, 'sourceOntology')
-        targetOntology=config.get(section, 'targetOntology')
-
-        fuzzyUpperLimit=float(config.get(section,'fuzzyUpperLimit'))
-        fuzzyLowerLimit=float(config.get(section,'fuzzyLowerLimit'))
-        fuzzyUpperFactor=float(config.get(section,'fuzzyUpperFactor'))
-        fuzzyLowerFactor=float(config.get(section,'fuzzyLowerFactor'))
-        oxoDistanceOne=float(config.get(section,'oxoDistanceOne'))
-        oxoDistanceTwo=float(config.get(section,'oxoDistanceTwo'))
-        oxoDistanceThree=float(config.get(section,'oxoDistanceThree'))
-        synFuzzyFactor=float(config.get(section,'synFuzzyFactor'))
-        #synOxoFactor=float(config.get(section,'synOxoFactor'))
-        bridgeOxoFactor=float(config.get(section,'bridgeOxoFactor'))
-        threshold=float(config.get(section,'threshold'))
-        #params={"fuzzyUpperLimit": fuzzyUpperLimit, "fuzzyLowerLimit": fuzzyLowerLimit,"fuzzyUpperFactor": fuzzyUpperFactor,"fuzzyLowerFactor":fuzzyLowerFactor, "oxoDistanceOne":oxoDistanceOne, "oxoDistanceTwo":oxoDistanceTwo, "oxoDistanceThree":oxoDistanceThree, "synFuzzyFactor":synFuzzyFactor, "synOxoFactor": synOxoFactor, "bridgeOxoFactor":bridgeOxoFactor, "threshold":threshold}
-        params={"fuzzyUpperLimit": fuzzyUpperLimit, "fuzzyLowerLimit": fuzzyLowerLimit,"fuzzyUpperFactor": fuzzyUpperFactor,"fuzzyLowerFactor":fuzzyLowerFactor, "oxoDistanceOne":oxoDistanceOne, "oxoDistanceTwo":oxoDistanceTwo, "oxoDistanceThree":oxoDistanceThree, "synFuzzyFactor":synFuzzyFactor, "bridgeOxoFactor":bridgeOxoFactor, "threshold":threshold}
-        print "Calculate "+sourceOntology+" "+targetOntology
-        logging.info("Calculate "+sourceOntology+" "+targetOntology)
-        calculatePrimaryScore(sourceOntology+"_"+targetOntology, params, scoringTargetFolder, writeToDisc, predictedTargetFolder, curationOfDoubleEntries)
+    runSections("calculate", sections, (writeToDisc, curationOfDoubleEntries))
 
+#Calculates the score of the pair of ontologies of one section
+def calculateSection(section, writeToDisc, curationOfDoubleEntries):
+    scoringTargetFolder=config.get('Params','scoringTargetFolder')
+    predictedTargetFolder=config.get('Params','predictedTargetFolder')
+    sourceOntology=config.get(section, 'sourceOntology')
+    targetOntology=config.get(section, 'targetOntology')
 
-def exportNeoList(sections):
-    for section in sections:
-        sourceOntology=config.get(section, 'sourceOntology')
-        targetOntology=config.get(section, 'targetOntology')
-        predictedFolder=config.get('Params','predictedTargetFolder')
-        targetFolder=config.get('Params','neoFolder')
+    params=readSectionParams(section)
+    print "Calculate "+sourceOntology+" "+targetOntology
+    logging.info("Calculate "+sourceOntology+" "+targetOntology)
+    calculatePrimaryScore(sourceOntology+"_"+targetOntology, params, scoringTargetFolder, writeToDisc, predictedTargetFolder, curationOfDoubleEntries)
 
-        if os.path.exists(predictedFolder)==False:
-            print "Could not find "+predictedFolder+" - please make sure input file exists!\n"
-            raise Exception("File does not exists")
-        if os.path.exists(targetFolder)==False:
-            print "Could not find "+targetFolder+" - please make sure input file exists!\n"
-            raise Exception("File does not exists")
 
-        olsURL=config.get('Basics', 'olsAPIURL')
-        neoURL=config.get('Basics','neoURL')
-        neoUser=config.get('Basics','neoUser')
-        neoPW=config.get('Basics','neoPW')
+def exportNeoList(sections):
+    predictedFolder=config.get('Params','predictedTargetFolder')
+    targetFolder=config.get('Params','neoFolder')
 
-        neoExporter.exportInNeo(sourceOntology, targetOntology, predictedFolder, targetFolder, olsURL, neoURL, neoUser, neoPW)
+    if os.path.exists(predictedFolder)==False:
+        print "Could not find "+predictedFolder+" - please make sure input file exists!\n"
+        raise Exception("File does not exists")
+    if os.path.exists(targetFolder)==False:
+        print "Could not find "+targetFolder+" - please make sure input file exists!\n"
+        raise Exception("File does not exists")
 
+    runSections("neo", sections)
     print "Completed neo4J export"
 
+#Exports the predicted mappings of one section in a neo4j compatible format
+def exportNeoSection(section):
+    sourceOntology=config.get(section, 'sourceOntology')
+    targetOntology=config.get(section, 'targetOntology')
+    predictedFolder=config.get('Params','predictedTargetFolder')
+    targetFolder=config.get('Params','neoFolder')
+
+    olsURL=config.get('Basics', 'olsAPIURL')
+    neoURL=config.get('Basics','neoURL')
+    neoUser=config.get('Basics','neoUser')
+    neoPW=config.get('Basics','neoPW')
+
+    #Number of parallel OLS calls to resolve the terms and an optional folder for the resolved terms of every ontology
+    neoWorkers=8
+    neoTermCacheFolder=None
+    if config.has_option('Params','neoWorkers'):
+        neoWorkers=config.getint('Params','neoWorkers')
+    if config.has_option('Params','neoTermCacheFolder'):
+        neoTermCacheFolder=config.get('Params','neoTermCacheFolder')
+
+    #Send terms and mappings over bolt instead of LOAD CSV, in batches of neoBatchSize rows by neoWriters sessions
+    neoBolt=False
+    neoBatchSize=10000
+    neoWriters=4
+    if config.has_option('Params','neoBolt'):
+        neoBolt=config.getboolean('Params','neoBolt')
+    if config.has_option('Params','neoBatchSize'):
+        neoBatchSize=config.getint('Params','neoBatchSize')
+    if config.has_option('Params','neoWriters'):
+        neoWriters=config.getint('Params','neoWriters')
+
+    neoExporter.exportInNeo(sourceOntology, targetOntology, predictedFolder, targetFolder, olsURL, neoURL, neoUser, neoPW, neoWorkers, neoTermCacheFolder, neoBolt, neoBatchSize, neoWriters)
+
+#Work that runSections can do for a section
+sectionTasks={"score": scoreSection, "calculate": calculateSection, "neo": exportNeoSection}
+
+#Runs a task for the given sections and prints a summary with wall time, api calls and failed api calls per section.
+#With sectionWorkers>1 the sections run in parallel processes, each logging to its own file next to the logFile.
+#apiConcurrency limits the number of api calls in flight, shared by all sections and threads
+def runSections(task, sections, args=()):
+    sectionWorkers=1
+    if config.has_option("Params", 'sectionWorkers'):
+        sectionWorkers=config.getint("Params", 'sectionWorkers')
+    if config.has_option("Params", 'apiConcurrency'):
+        httpClient.setLimiter(multiprocessing.BoundedSemaphore(config.getint("Params", 'apiConcurrency')))
+
+    if sectionWorkers>1 and len(sections)>1:
+        print "Run "+str(len(sections))+" sections with "+str(sectionWorkers)+" processes, see "+sectionLogFile("<section>")+" for the logs"
+        logging.info("Run "+str(len(sections))+" sections with "+str(sectionWorkers)+" processes")
+        #The in-memory caches (e.g. of the relaxed search) are per process, only the api cache is shared by the sections
+        if paxo_internals.cache==None:
+            print "No cacheFile configured, the sections do not share their webservice calls"
+            logging.info("No cacheFile configured, the sections do not share their webservice calls")
+        #A fresh process per section, so every section starts with its own connections and counters
+        pool=multiprocessing.Pool(sectionWorkers, maxtasksperchild=1)
+        try:
+            #map_async with a timeout, a plain map can not be stopped with ctrl-c
+            summary=pool.map_async(runSectionProcess, [(task, section, args) for section in sections], 1).get(365*24*3600)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        summary=[runSection(task, section, args) for section in sections]
+
+    printSectionSummary(summary)
+    failed=[row for row in summary if row[5]!="ok"]
+    if len(failed)>0:
+        raise Exception(str(len(failed))+" of "+str(len(sections))+" sections failed, see the section logs")
+    return summary
+
+def sectionLogFile(section):
+    return os.path.splitext(logFile)[0]+"_"+section+".log"
+
+#Runs a task for one section. Returns the row of the summary: section, pair, wall time, api calls, failed api calls, status
+def runSection(task, section, args, catchErrors=False):
+    pair=config.get(section, 'sourceOntology')+"_"+config.get(section, 'targetOntology')
+    calls=httpClient.client.calls
+    failures=httpClient.client.failures
+    start=time.time()
+    status="ok"
+    try:
+        sectionTasks[task](section, *args)
+    except Exception as e:
+        if catchErrors==False:
+            raise
+        logging.exception("Section "+section+" failed")
+        status="failed: "+str(e)
+    return [section, pair, round(time.time()-start, 1), httpClient.client.calls-calls, httpClient.client.failures-failures, status]
+
+#Entry point of a worker process of runSections. Logs to the file of the section and opens its own connections.
+#Errors are reported in the summary, so the other sections are not stopped
+def runSectionProcess(job):
+    task, section, args=job
+    root=logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler=logging.FileHandler(sectionLogFile(section))
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    root.addHandler(handler)
+
+    httpClient.renew()
+    if paxo_internals.cache!=None:
+        paxo_internals.cache.reopen()
+
+    row=runSection(task, section, args, True)
+
+    if paxo_internals.cache!=None:
+        logging.info(paxo_internals.cache.stats())
+        paxo_internals.cache.close()
+    return row
+
+def printSectionSummary(summary):
+    lines=["%-20s %-20s %12s %10s %10s  %s" % ("section", "pair", "wall time s", "api calls", "failures", "status")]
+    for row in summary:
+        lines.append("%-20s %-20s %12s %10s %10s  %s" % tuple(row))
+    for line in lines:
+        print line
+        logging.info(line)
+
 
 def runListAnnotation():
     inputFile=config.get("Basics","inputFile")
@@ -453,9 +952,26 @@ def runListAnnotation():
 
     #params={"fuzzyUpperLimit": fuzzyUpperLimit, "fuzzyLowerLimit": fuzzyLowerLimit,"fuzzyUpperFactor": fuzzyUpperFactor,"fuzzyLowerFactor":fuzzyLowerFactor, "oxoDistanceOne":oxoDistanceOne, "oxoDistanceTwo":oxoDistanceTwo, "oxoDistanceThree":oxoDistanceThree, "synFuzzyFactor":synFuzzyFactor, "synOxoFactor": synOxoFactor, "bridgeOxoFactor":bridgeOxoFactor, "threshold":threshold, "ols": olsURL, "oxo":oxoURL}
     params={"fuzzyUpperLimit": fuzzyUpperLimit, "fuzzyLowerLimit": fuzzyLowerLimit,"fuzzyUpperFactor": fuzzyUpperFactor,"fuzzyLowerFactor":fuzzyLowerFactor, "oxoDistanceOne":oxoDistanceOne, "oxoDistanceTwo":oxoDistanceTwo, "oxoDistanceThree":oxoDistanceThree, "synFuzzyFactor":synFuzzyFactor, "bridgeOxoFactor":bridgeOxoFactor, "threshold":threshold, "ols": olsURL, "oxo":oxoURL}
-    options={"inputFile":inputFile, "resultFile":resultFile, "delimiter":delimiter, "targetOntology":targetOntology, "detailLevel": detailLevel, "synonymSplitChar":synonymSplitChar}
+    #Number of input rows scored in parallel
+    listWorkers=1
+    if config.has_option("Basics", 'listWorkers'):
+        listWorkers=config.getint("Basics", 'listWorkers')
+    options={"inputFile":inputFile, "resultFile":resultFile, "delimiter":delimiter, "targetOntology":targetOntology, "detailLevel": detailLevel, "synonymSplitChar":synonymSplitChar, "workers":listWorkers}
     #ScoreParameters define stopwords
-    scoreParams={"removeStopwordsList": stopwordList, "replaceTermList" : replacementTerms}
+    scoreParams=listprocessing.scoreParameters(stopwordList)
+
+    #Register the version of the target ontology, so cached replies of an older release are not used
+    if paxo_internals.cache!=None:
+        try:
+            r = httpClient.get(olsURL+"ontologies/"+targetOntology)
+            paxo_internals.cache.setOntologyVersion(targetOntology, r.json()["updated"], r.json()["config"]["versionIri"])
+        except Exception as e:
+            logging.error("Could not get the version of "+targetOntology+" for the api cache")
+            logging.error(e)
+
+    localFuzzyIndex, localIndexFolder=readLocalIndexParams()
+    if localFuzzyIndex==True:
+        paxo_internals.loadLocalIndex(targetOntology, olsURL, localIndexFolder)
 
     listprocessing.runListProcessing(options, params, scoreParams)
 
@@ -464,22 +980,15 @@ def runListAnnotation():
 
 ## Here main starts ##
 
-####First definition of two global variables
-replacementTerms={
-"ordo_hp" : [('cancer', 'carcinom'), ('cancer', 'neoplasm'), ('cancer','carcinoma'),('tumor', 'neoplasm'), ('tumor','cancer'), ('abnormality', 'disease'), ('decreased', 'reduced'), ('morphology', '')],
-"doid_mp" : [],
-"doid_ordo" :[],
-"hp_doid" : [('cancer', 'neoplasm'), ('cancer','carcinoma'), ('abnormality','disease'), 'abnormality','disease'],
-"hp_mp" : [('cancer', 'carcinom'), ('cancer', 'neoplasm'), ('cancer','carcinoma'),('abnormality','disease'), ('abnormal','Abnormality')],
-"ordo_mp" : []
-}
-
 helptext="""Start the client with exactly two input parameters: The path to the config file and one of the following flags:
             -l: Create mappings for a list of terms with an ontology
             -s: Create the primary raw score for two ontologies or a set of two ontologies.
+            -si: Update the primary raw score, only terms that changed since the last run are scored again
             -c: Calculate from the primary raw score a predicted score
             -cv: Calculate a predicted score but also validate it against given standard files.
             -n: Reads in a predicted score file and exports it to a neo4j compatible format
+            -e: Exports the binary primary raw score to the scoring csv
+            -sweep: Validates many parameter sets (sweep options in Params) against the standards, the raw score is read once
 
             example: python paxo.py config.ini -s
             """
@@ -499,6 +1008,58 @@ elif len(sys.argv)==3:
     logging.basicConfig(filename=logFile, level=logging.INFO, format='%(asctime)s - %(message)s')
     writeToDiscFlag=config.getboolean("Params","writeToDiscFlag")
     uniqueMaps=config.getboolean("Params","uniqueMaps")
+    #With uniqueMaps, the IRIs that may only appear once: target (one mapping per target term), source (one mapping per
+    #source term) or both (one-to-one mappings)
+    uniqueMapsPolicy="target"
+    if config.has_option("Params","uniqueMapsPolicy"):
+        uniqueMapsPolicy=config.get("Params","uniqueMapsPolicy")
+        if uniqueMapsPolicy not in paxo_internals.uniqueMapsPolicies:
+            print "uniqueMapsPolicy has to be one of "+", ".join(paxo_internals.uniqueMapsPolicies)
+            raise Exception("Unknown uniqueMapsPolicy "+uniqueMapsPolicy)
+
+    #Retries and circuit breaker of the webservice calls
+    httpRetries=4
+    httpBackoffMax=300
+    httpTimeout=120
+    circuitFailureThreshold=10
+    circuitResetTimeout=60
+    if config.has_option("Params","httpRetries"):
+        httpRetries=config.getint("Params","httpRetries")
+    if config.has_option("Params","httpBackoffMax"):
+        httpBackoffMax=config.getint("Params","httpBackoffMax")
+    if config.has_option("Params","httpTimeout"):
+        httpTimeout=config.getint("Params","httpTimeout")
+    if config.has_option("Params","circuitFailureThreshold"):
+        circuitFailureThreshold=config.getint("Params","circuitFailureThreshold")
+    if config.has_option("Params","circuitResetTimeout"):
+        circuitResetTimeout=config.getint("Params","circuitResetTimeout")
+    httpClient.configure(httpRetries, httpBackoffMax, httpTimeout, circuitFailureThreshold, circuitResetTimeout)
+
+    #Number of normalised labels kept in memory for the string matching
+    if config.has_option("Params","labelCacheSize"):
+        paxo_internals.configureLabelCache(config.getint("Params","labelCacheSize"))
+
+    #Number of labels whose relaxed OLS search (bridge candidates) is kept for the following sections
+    if config.has_option("Params","relaxedSearchCacheSize"):
+        paxo_internals.configureRelaxedSearchCache(config.getint("Params","relaxedSearchCacheSize"))
+
+    #Run the independent webservice calls of a term (fuzzy, relaxed and Oxo search) in parallel threads
+    if config.has_option("Params","concurrentCalls"):
+        paxo_internals.configureConcurrentCalls(config.getint("Params","concurrentCalls"))
+
+    #Resolve Oxo CURIEs from an index of all terms of the mapping target instead of one call per CURIE
+    if config.has_option("Params","oxoTermIndex"):
+        paxo_internals.configureOxoTermIndex(config.getboolean("Params","oxoTermIndex"))
+
+    #Optional persistent cache for the OLS and Oxo api calls
+    if config.has_option("Params","cacheFile"):
+        cacheTTL=30*24*3600
+        cacheMaxSizeMB=2048
+        if config.has_option("Params","cacheTTL"):
+            cacheTTL=config.getint("Params","cacheTTL")
+        if config.has_option("Params","cacheMaxSizeMB"):
+            cacheMaxSizeMB=config.getint("Params","cacheMaxSizeMB")
+        paxo_internals.configureCache(config.get("Params","cacheFile"), cacheTTL, cacheMaxSizeMB)
 
     #Throw away the first 2 sections and take only the actual mapping part of the config into account
     sections=config.sections()[2:]
@@ -506,12 +1067,18 @@ elif len(sys.argv)==3:
         runListAnnotation()
     elif sys.argv[2]=="-s":
         scoreListOntologies(sections)
+    elif sys.argv[2]=="-si":
+        scoreListOntologies(sections, True)
     elif sys.argv[2]=="-c":
         calculateListOntologies(sections, writeToDiscFlag, uniqueMaps)
     elif sys.argv[2]=="-cv":
         print calculateAndValidateListOntologies(sections, writeToDiscFlag, uniqueMaps)
     elif sys.argv[2]=="-n":
         exportNeoList(sections)
+    elif sys.argv[2]=="-e":
+        exportScoreList(sections)
+    elif sys.argv[2]=="-sweep":
+        sweepListOntologies(sections, uniqueMaps)
     else:
         print "Could not recognize option. So I execute what's uncommented in the else branch. This should just be during development"
         #Could/Should be changed so parameters come from the config file
@@ -521,3 +1088,8 @@ elif len(sys.argv)==3:
         scoreParams={"removeStopwordsList": ['of', 'the'], "replaceTermList" : []}
         params={"fuzzyUpperLimit": 0.6, "fuzzyLowerLimit": 0.6,"fuzzyUpperFactor": 1,"fuzzyLowerFactor":0.6, "oxoDistanceOne":1, "oxoDistanceTwo":0.3, "oxoDistanceThree":0.1, "synFuzzyFactor":0.6, "synOxoFactor": 0.4, "bridgeOxoFactor":1, "threshold":0.6, "ols":"https://www.ebi.ac.uk/ols/api/", "oxo":"https://www.ebi.ac.uk/ols/api/"}
         print paxo_internals.scoreTermLabel("Nuclear cataract", "doid", scoreParams, params)
+
+    if paxo_internals.cache!=None:
+        print paxo_internals.cache.stats()
+        logging.info(paxo_internals.cache.stats())
+        paxo_internals.cache.close()
@@ -0,0 +1,166 @@
+#Web service for the list processing: scores labels (and synonyms) against a target ontology without going through
+#an input and a result file. Run it under gunicorn, the config file is taken from the environment variable PAXO_CONFIG:
+#   PAXO_CONFIG=listprocessing_config.ini gunicorn --workers 4 --bind 0.0.0.0:5000 --timeout 600 paxoService:app
+import paxo_internals
+import listprocessing
+import httpClient
+import logging
+import json
+import os
+import threading
+import functools
+from multiprocessing.dummy import Pool as ThreadPool
+from ConfigParser import SafeConfigParser
+
+from flask import Flask
+from flask import request
+from flask import jsonify
+from flask import Response
+app = Flask(__name__)
+
+#Scoring parameters of the service, read once from the config file
+service={}
+
+def readServiceConfig(configFile):
+    config = SafeConfigParser()
+    if len(config.read(configFile))==0:
+        raise Exception("Could not read the config file "+configFile)
+    logging.basicConfig(filename=config.get("Basics","logFile"), level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    params={"ols": config.get("Basics","olsAPIURL"), "oxo": config.get("Basics","oxoURL")}
+    for name in ['fuzzyUpperLimit', 'fuzzyLowerLimit', 'fuzzyUpperFactor', 'fuzzyLowerFactor', 'oxoDistanceOne', 'oxoDistanceTwo', 'oxoDistanceThree', 'synFuzzyFactor', 'bridgeOxoFactor', 'threshold']:
+        params[name]=float(config.get("Basics", name))
+    #Same score parameters as the list processing (-l) of paxo.py
+    scoreParams=listprocessing.scoreParameters(config.get("Params","StopwordsList").split(','))
+
+    #Number of labels of a request scored in parallel and the largest accepted request
+    serviceWorkers=8
+    maxBatchSize=10000
+    if config.has_option("Basics", 'serviceWorkers'):
+        serviceWorkers=config.getint("Basics", 'serviceWorkers')
+    if config.has_option("Basics", 'maxBatchSize'):
+        maxBatchSize=config.getint("Basics", 'maxBatchSize')
+
+    #Retries and circuit breaker of the webservice calls, like paxo.py
+    httpRetries=4
+    httpBackoffMax=300
+    httpTimeout=120
+    circuitFailureThreshold=10
+    circuitResetTimeout=60
+    if config.has_option("Params","httpRetries"):
+        httpRetries=config.getint("Params","httpRetries")
+    if config.has_option("Params","httpBackoffMax"):
+        httpBackoffMax=config.getint("Params","httpBackoffMax")
+    if config.has_option("Params","httpTimeout"):
+        httpTimeout=config.getint("Params","httpTimeout")
+    if config.has_option("Params","circuitFailureThreshold"):
+        circuitFailureThreshold=config.getint("Params","circuitFailureThreshold")
+    if config.has_option("Params","circuitResetTimeout"):
+        circuitResetTimeout=config.getint("Params","circuitResetTimeout")
+    httpClient.configure(httpRetries, httpBackoffMax, httpTimeout, circuitFailureThreshold, circuitResetTimeout)
+
+    if config.has_option("Params","labelCacheSize"):
+        paxo_internals.configureLabelCache(config.getint("Params","labelCacheSize"))
+    if config.has_option("Params","concurrentCalls"):
+        paxo_internals.configureConcurrentCalls(config.getint("Params","concurrentCalls"))
+    if config.has_option("Params","cacheFile"):
+        cacheTTL=30*24*3600
+        cacheMaxSizeMB=2048
+        if config.has_option("Params","cacheTTL"):
+            cacheTTL=config.getint("Params","cacheTTL")
+        if config.has_option("Params","cacheMaxSizeMB"):
+            cacheMaxSizeMB=config.getint("Params","cacheMaxSizeMB")
+        paxo_internals.configureCache(config.get("Params","cacheFile"), cacheTTL, cacheMaxSizeMB)
+
+    service.update({"params": params, "scoreParams": scoreParams, "workers": serviceWorkers, "maxBatchSize": maxBatchSize})
+    logging.info("Scoring service started with "+str(serviceWorkers)+" workers per process")
+
+@app.route("/")
+def hello():
+    return "Hello World!"
+
+#Offers an endpoint for scoreTermLabel, returns the best mapping of a single label (empty if nothing was found)
+@app.route("/scoreTermLabel/")
+def jsonScoreTermLabel():
+    label = request.args.get('termLabel', default = "", type = str)
+    targetOntology = request.args.get('targetOntology', default = "", type = str)
+    if label=="" or targetOntology=="":
+        return jsonify({"error": "termLabel and targetOntology are required"}), 400
+    scoredTerm=paxo_internals.scoreTermLabel(label, targetOntology, service["scoreParams"], service["params"])
+    if len(scoredTerm)==0:
+        return jsonify({})
+    return jsonify(scoredTerm[0])
+
+#Scores a batch of terms for one target ontology. Expects a json body like
+#   {"targetOntology": "doid", "terms": [{"id": "ID1", "label": "nuclear cataract", "synonyms": ["cataract"]}], "detailLevel": 0}
+#and streams one json line per term back as soon as it is scored, so the order of the reply is not the order of the request
+@app.route("/scoreTermLabels/", methods=['POST'])
+def jsonScoreTermLabels():
+    body=request.get_json(force=True, silent=True)
+    if body==None or "targetOntology" not in body or not isinstance(body.get("terms"), list):
+        return jsonify({"error": "Expected a json body with targetOntology and a list of terms"}), 400
+    terms=body["terms"]
+    if len(terms)>service["maxBatchSize"]:
+        return jsonify({"error": "Too many terms, at most "+str(service["maxBatchSize"])+" are accepted per request"}), 413
+    for term in terms:
+        if not isinstance(term, dict) or "label" not in term:
+            return jsonify({"error": "Every term needs a label"}), 400
+
+    targetOntology=body["targetOntology"]
+    detailLevel=int(body.get("detailLevel", 0))
+    labelLookup={"labels": {}, "lock": threading.Lock(), "url": service["params"]['ols']+"search"}
+    #Scores of the normalised labels of this request, shared by its worker threads
+    scored={"labels": {}, "lock": threading.Lock()}
+    scoreTerm=functools.partial(scoreServiceTerm, targetOntology=targetOntology, detailLevel=detailLevel, labelLookup=labelLookup, scored=scored)
+
+    def generate():
+        pool=ThreadPool(max(1, min(service["workers"], len(terms))))
+        try:
+            for reply in pool.imap_unordered(scoreTerm, terms):
+                yield json.dumps(reply)+"\n"
+        finally:
+            pool.close()
+            pool.join()
+    return Response(generate(), mimetype='application/x-ndjson')
+
+#Scores the label and synonyms of a term. Labels of a request that only differ in case and whitespace are scored once,
+#with the first spelling that is seen, like in the list processing. Errors are returned as part of the reply of the term,
+#so one bad term does not stop the stream
+def scoreServiceTerm(term, targetOntology, detailLevel, labelLookup, scored):
+    reply={"id": term.get("id"), "label": term["label"]}
+    try:
+        labels=[term["label"]]+[synonym.strip() for synonym in term.get("synonyms") or []]
+        potentialReply=[]
+        for label in labels:
+            key=listprocessing.normaliseInputLabel(label).encode(encoding='UTF-8')
+            with scored["lock"]:
+                labelReply=scored["labels"].get(key)
+            #Two threads may score the same new label at the same time, the first result is kept for both
+            if labelReply==None:
+                labelReply=paxo_internals.scoreTermLabel(label.encode(encoding='UTF-8'), targetOntology, service["scoreParams"], service["params"])
+                with scored["lock"]:
+                    labelReply=scored["labels"].setdefault(key, labelReply)
+            if labelReply!=[]:
+                potentialReply.append(labelReply)
+
+        if potentialReply==[]:
+            reply.update({"mappedId": None, "mappedLabel": None, "score": 0})
+            return reply
+        #Highest finale score first, like the list processing
+        potentialReply=sorted(potentialReply, key=lambda potentialReply:potentialReply[0]['finaleScore'], reverse=True)[0]
+        reply.update({"mappedId": potentialReply[0]['iri'], "mappedLabel": listprocessing.getMappedLabel(potentialReply[0], targetOntology, labelLookup).decode('UTF-8'), "score": potentialReply[0]['fuzzyScore']})
+        if detailLevel==1:
+            reply["mappings"]=[{"mappedIRI":tmpReply['iri'], "score":tmpReply['fuzzyScore']} for tmpReply in potentialReply]
+        elif detailLevel>1:
+            reply["mappings"]=potentialReply
+    except Exception as e:
+        logging.error("Problem scoring "+repr(term))
+        logging.error(e)
+        reply["error"]=str(e)
+    return reply
+
+readServiceConfig(os.environ.get("PAXO_CONFIG", "listprocessing_config.ini"))
+
+#Development server, use gunicorn for anything else
+if __name__ == "__main__":
+    app.run(port=int(os.environ.get("PAXO_PORT", 5000)), threaded=True)
@@ -1,56 +1,117 @@
 import time
 import logging
-import requests
+import threading
+import sys
+import os
+import functools
+from multiprocessing.dummy import Pool as ThreadPool
+from collections import OrderedDict
 import Levenshtein
+import apiCache
+import httpClient
+import localIndex
 
-from flask import Flask
-from flask import request
-from flask import jsonify
-app = Flask(__name__)
+#Optional persistent response cache (apiCache.ApiCache), set via configureCache
+cache=None
 
-@app.route("/")
-def hello():
-    return "Hello World!"
+def configureCache(cacheFile, ttl, maxSizeMB):
+    global cache
+    cache=apiCache.ApiCache(cacheFile, ttl, maxSizeMB)
+    logging.info("Using api cache "+cacheFile)
+    return cache
 
-#Offers an endpoint for scoreTermLabel
-@app.route("/scoreTermLabel/")
-def jsonScoreTermLabel():
-    label = request.args.get('termLabel', default = 1, type = str)
-    targetOntology = request.args.get('targetOntology', default = 1, type = str)
-    scoredTerm=scoreTermLabel(label, targetOntology, {})
-    return jsonify(scoredTerm[0])
-
-#General function to do webservice calls via requests. Retries 3 times in case of failure before it fails for good
+#General function to do webservice calls. Answered from the api cache if possible, otherwise executed via the
+#httpClient (retries with backoff, circuit breaker) and stored in the cache
 def apiCall(url, data):
-    try:
-        r = requests.get(url, data)
-    except:
-        time.sleep(10)
-        logging.info("API exception, try again after 10 second delay")
-        try:
-            r = requests.get(url, data)
-            logging.info("Success after 10 seconds")
-        except:
-            logging.info("API exception failed, again - try, now after addtional 120 seconds delay!")
-            time.sleep(120)
-            try:
-                r = requests.get(url, data)
-                logging.info("Success after 120 seconds")
-            except:
-                logging.info("API exception failed, again - try, now after addtional 120 seconds delay!")
-                time.sleep(300)
-                try:
-                    r = requests.get(url, data)
-                    logging.info("Success after 300 seconds")
-                except:
-                    logging.info("Last try failed as well, abort. Total of 4 tries failed, so I let the whole process fail")
-                    logging.info(url)
-                    logging.info(data)
-                    logging.info(r.status_code)
-                    logging.info(r.request.url)
-                    raise
+    if cache!=None:
+        cached=cache.get(url, data)
+        if cached!=None:
+            return cached
+
+    r=httpClient.get(url, data)
+
+    if cache!=None:
+        cache.put(url, data, r)
     return r
 
+#Number of threads for the independent webservice calls of a term (fuzzy search, relaxed search, Oxo searches), 0 runs
+#them one after another. The calls share the pooled session of the httpClient
+concurrentCalls=0
+callPool=None
+callPoolPid=None
+callPoolLock=threading.Lock()
+
+def configureConcurrentCalls(workers):
+    global concurrentCalls
+    concurrentCalls=workers
+
+#Thread pool of the concurrent calls, created on first use in every process because threads do not survive a fork
+def getCallPool():
+    global callPool, callPoolPid
+    with callPoolLock:
+        if callPool==None or callPoolPid!=os.getpid():
+            callPool=ThreadPool(max(1, concurrentCalls))
+            callPoolPid=os.getpid()
+        return callPool
+
+#CURIE -> IRI resolutions of Oxo terms, memoized across all terms (and threads) of a run
+curieIris={}
+indexedDatasources=set()
+curieLock=threading.Lock()
+indexLock=threading.Lock()
+#If True, all terms of a mapping target datasource are loaded once from the Oxo terms endpoint instead of resolving every CURIE on its own
+useOxoTermIndex=False
+
+def configureOxoTermIndex(flag):
+    global useOxoTermIndex
+    useOxoTermIndex=flag
+
+#Walks the paged Oxo terms of a datasource and adds their CURIE -> IRI pairs to curieIris
+def indexOxoTerms(datasource, url):
+    with indexLock:
+        if datasource in indexedDatasources:
+            return
+        logging.info("Building Oxo CURIE index for "+datasource)
+        page=0
+        counter=0
+        while True:
+            data={"datasource":datasource, "page":page, "size":1000}
+            reply=apiCall(url+"terms", data).json()
+            try:
+                terms=reply['_embedded']['terms']
+            except KeyError:
+                break
+            if len(terms)==0:
+                break
+            with curieLock:
+                for term in terms:
+                    curieIris[term['curie']]=term['uri']
+            counter=counter+len(terms)
+            page=page+1
+        indexedDatasources.add(datasource)
+        logging.info("Oxo CURIE index for "+datasource+" holds "+str(counter)+" terms")
+
+#Resolves the CURIEs of a Oxo search reply to IRIs. Known CURIEs come from curieIris, the rest is looked up once via the mappings endpoint
+def resolveCuries(mappingResponseList, url):
+    if useOxoTermIndex==True:
+        for row in mappingResponseList:
+            if 'targetPrefix' in row and row['targetPrefix'] not in indexedDatasources:
+                indexOxoTerms(row['targetPrefix'], url)
+
+    iris=[]
+    for row in mappingResponseList:
+        curie=row['curie']
+        with curieLock:
+            iri=curieIris.get(curie)
+        if iri==None:
+            data={"fromId":curie}
+            longId=apiCall(url+"mappings", data)
+            iri=longId.json()['_embedded']['mappings'][0]['fromTerm']['uri']
+            with curieLock:
+                curieIris[curie]=iri
+        iris.append(iri)
+    return iris
+
 #Takes an input label and executes the oxo call
 def oxoMatch(termLabel, targetOntology, url):
     data={"ids":termLabel, "mappingTarget":targetOntology, "distance":3} #Maybe include also 'querySource='parameters
@@ -61,12 +122,10 @@ def oxoMatch(termLabel, targetOntology, url):
         tmpList=[]
         sourceCurie=jsonReply['curie']
         if len(jsonReply['mappingResponseList'])>0:
-            for row in jsonReply['mappingResponseList']:
-                data={"fromId":row['curie']}
-                longId=apiCall(url+"mappings", data)
-                longId=longId.json()['_embedded']['mappings'][0]['fromTerm']['uri']
+            iris=resolveCuries(jsonReply['mappingResponseList'], url)
+            for row, longId in zip(jsonReply['mappingResponseList'], iris):
                 tmpList.append({"curie":longId, "distance":row['distance'], "oxoLabel":row['label']})
-                sortedCurie=sorted(tmpList, key=lambda tmpList: tmpList['distance'], reverse=False)
+            sortedCurie=sorted(tmpList, key=lambda tmpList: tmpList['distance'], reverse=False)
         else:
             sortedCurie=[{"curie":"UNKNOWN", "distance": 0, "oxoLabel":"UNKNOWN"}]
 
@@ -84,78 +143,221 @@ def sortWords(term):
     term=' '.join(StringList)
     return term
 
-def stringMatcher(sourceTerm, targetTerm, replaceTermList, removeStopwordsList):
-    #First calculate Lev without changes
-    lev=round(Levenshtein.ratio(sourceTerm, targetTerm), 5)
-
-    sourceTerm=sortWords(sourceTerm)
-    targetTerm=sortWords(targetTerm)
-
-    replacementLev=round(Levenshtein.ratio(sourceTerm, targetTerm), 5)
-    if replacementLev>lev:
-        lev=replacementLev
+#Normalised forms of a label as used by stringMatcher: the label itself, sorted words, sorted words without stop words
+#and the sorted variants for every replacement. They only depend on the label, so they are computed once per label
+def normaliseLabel(term, replaceTermList, removeStopwordsList):
+    sortedTerm=sortWords(term)
 
     #Remove stop words
+    strippedTerm=sortedTerm
     for stop in removeStopwordsList:
-        sourceTerm=sourceTerm.replace(stop,'').strip().replace('  ', ' ')
-        targetTerm=targetTerm.replace(stop, '').strip().replace('  ', ' ')
+        strippedTerm=strippedTerm.replace(stop,'').strip().replace('  ', ' ')
 
-    #Replace terms in source to trying to find higher score
+    #Replace terms trying to find a higher score
+    replacedTerms=[]
     for replacement in replaceTermList:
-        tmpSource=sourceTerm.replace(replacement[0], replacement[1])
-        tmpSource=sortWords(tmpSource)
-        replacementLev=round(Levenshtein.ratio(tmpSource, targetTerm), 5)
+        replacedTerms.append(sortWords(strippedTerm.replace(replacement[0], replacement[1])))
+
+    return (term, sortedTerm, strippedTerm, replacedTerms)
+
+#Highest Levenshtein ratio between two normalised labels. The replacements are applied to the source and to the target,
+#each time compared to the other label without replacement. 1 is the highest possible score, so we can stop there
+def scoreNormalisedLabels(source, target):
+    ratio=Levenshtein.ratio
+    lev=round(ratio(source[0], target[0]), 5)
+    if lev==1:
+        return lev
+
+    replacementLev=round(ratio(source[1], target[1]), 5)
+    if replacementLev>lev:
+        lev=replacementLev
+
+    strippedTarget=target[2]
+    for tmpSource in source[3]:
+        replacementLev=round(ratio(tmpSource, strippedTarget), 5)
         if replacementLev>lev:
             lev=replacementLev
 
-    #Replace terms in target to trying to find higher score
-    for replacement in replaceTermList:
-        tmpTarget=targetTerm.replace(replacement[0], replacement[1])
-        tmpTarget=sortWords(tmpTarget)
-        replacementLev=round(Levenshtein.ratio(sourceTerm, tmpTarget), 5)
+    strippedSource=source[2]
+    for tmpTarget in target[3]:
+        replacementLev=round(ratio(strippedSource, tmpTarget), 5)
         if replacementLev>lev:
             lev=replacementLev
 
     return lev
 
+def stringMatcher(sourceTerm, targetTerm, replaceTermList, removeStopwordsList):
+    source=normaliseLabel(sourceTerm, replaceTermList, removeStopwordsList)
+    target=normaliseLabel(targetTerm, replaceTermList, removeStopwordsList)
+    return scoreNormalisedLabels(source, target)
+
+#Bounded LRU cache of normalised labels, shared by all terms, synonyms and threads of a run.
+#Popular target labels come back as candidates for many source labels, so their normalisation is reused
+class LabelCache:
+    def __init__(self, maxEntries, name="Label cache", sizeOf=None):
+        self.maxEntries=maxEntries
+        self.name=name
+        self.sizeOf=sizeOf
+        if sizeOf==None:
+            self.sizeOf=entrySize
+        self.entries=OrderedDict()
+        self.lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+        self.size=0
+
+    def get(self, key):
+        with self.lock:
+            value=self.entries.pop(key, None)
+            if value==None:
+                self.misses=self.misses+1
+                return None
+            self.entries[key]=value
+            self.hits=self.hits+1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key]=value
+            self.size=self.size+self.sizeOf(value)
+            while len(self.entries)>self.maxEntries:
+                oldKey, oldValue=self.entries.popitem(last=False)
+                self.size=self.size-self.sizeOf(oldValue)
+
+    def stats(self):
+        total=self.hits+self.misses
+        hitRate=0.0
+        if total>0:
+            hitRate=round(self.hits*100.0/total, 2)
+        return self.name+": "+str(len(self.entries))+" labels, approx. "+str(round(self.size/(1024.0*1024.0), 2))+" MB, "+str(self.hits)+" hits, "+str(self.misses)+" misses, hit rate "+str(hitRate)+"%"
+
+#Approximate memory of a normalised label
+def entrySize(value):
+    size=sys.getsizeof(value)+sys.getsizeof(value[3])
+    for part in value[:3]:
+        size=size+sys.getsizeof(part)
+    for part in value[3]:
+        size=size+sys.getsizeof(part)
+    return size
+
+labelCache=LabelCache(100000)
+
+#Approximate memory of the bridge candidates of a label
+def bridgeCandidatesSize(value):
+    size=sys.getsizeof(value)
+    for candidate in value:
+        size=size+sys.getsizeof(candidate)+sys.getsizeof(candidate[0])+sys.getsizeof(candidate[1])
+    return size
+
+#Bridge candidates (short_form, ontology_name) of the relaxed OLS search, per label. The search does not depend on the
+#target ontology, so sections that share a source ontology (hp_mp, hp_doid, ...) and run in the same process search every
+#label only once. The cache lives in the process: sections that run in their own process (sectionWorkers>1) share the
+#searches only through the api cache (cacheFile), whose key of the relaxed search does not depend on the target either
+relaxedSearchCache=LabelCache(200000, "Relaxed search cache", bridgeCandidatesSize)
+
+def configureRelaxedSearchCache(maxEntries):
+    global relaxedSearchCache
+    relaxedSearchCache=LabelCache(maxEntries, "Relaxed search cache", bridgeCandidatesSize)
+
+def configureLabelCache(maxEntries):
+    global labelCache
+    labelCache=LabelCache(maxEntries)
+
+def logLabelCacheStats():
+    for labels in [labelCache, relaxedSearchCache]:
+        print labels.stats()
+        logging.info(labels.stats())
+
+#normaliseLabel, answered from the labelCache. listsKey identifies the replaceTermList and removeStopwordsList
+def normaliseLabelCached(term, replaceTermList, removeStopwordsList, listsKey):
+    key=(term, listsKey)
+    normalised=labelCache.get(key)
+    if normalised==None:
+        normalised=normaliseLabel(term, replaceTermList, removeStopwordsList)
+        labelCache.put(key, normalised)
+    return normalised
+
+#Batch version of stringMatcher, scores one source label against a list of target labels.
+#Source and target labels are normalised once and then taken from the labelCache
+def stringMatcherBatch(sourceTerm, targetTerms, replaceTermList, removeStopwordsList):
+    listsKey=(tuple(removeStopwordsList), tuple(replaceTermList))
+    source=normaliseLabelCached(sourceTerm, replaceTermList, removeStopwordsList, listsKey)
+    scores=[]
+    for targetTerm in targetTerms:
+        target=normaliseLabelCached(targetTerm, replaceTermList, removeStopwordsList, listsKey)
+        scores.append(scoreNormalisedLabels(source, target))
+    return scores
+
+#Local candidate indexes (localIndex.OntologyIndex) by ontology name, used by olsFuzzyMatch instead of the OLS search
+localIndexes={}
+
+def loadLocalIndex(ontology, olsURL, snapshotFolder=None):
+    if ontology not in localIndexes:
+        localIndexes[ontology]=localIndex.loadIndex(ontology, olsURL, apiCall, snapshotFolder)
+    return localIndexes[ontology]
+
 #Takes an input label and executes the fuzzyOLS call
 def olsFuzzyMatch(termLabel, targetOntology, replaceTermList, removeStopwordsList, url):
+    sortedLev=olsFuzzySearch(termLabel, targetOntology, replaceTermList, removeStopwordsList, url)
+    return {"fuzzyTerms": sortedLev, "bridgeTerms": bridgeTerms(termLabel, targetOntology, url)}
+
+#Same as olsFuzzyMatch, the relaxed search runs in the call pool while the fuzzy search of the target ontology is done
+def olsFuzzyMatchConcurrent(termLabel, targetOntology, replaceTermList, removeStopwordsList, url):
+    relaxed=getCallPool().apply_async(bridgeTerms, (termLabel, targetOntology, url))
+    sortedLev=olsFuzzySearch(termLabel, targetOntology, replaceTermList, removeStopwordsList, url)
+    return {"fuzzyTerms": sortedLev, "bridgeTerms": relaxed.get()}
+
+#Fuzzy search of a label in the target ontology, the candidates sorted by their lev score
+def olsFuzzySearch(termLabel, targetOntology, replaceTermList, removeStopwordsList, url):
     url=url+"search"
     data={"q":termLabel, "ontology":targetOntology, "type":"class", "local":True, "fieldList":"label,iri,synonym"}
-    jsonReply=apiCall(url, data)
-    termLabel=termLabel.encode(encoding='UTF-8')
 
-    #WE found at least 1 hit
-    try:
-        jsonReply=jsonReply.json()['response']
-    except:
-        print "Error with deoding jsonReply from OLS api call!"
-        logging.error("Error with deoding jsonReply from OLS api call!")
-        print data
-        print url
-        logging.error(data)
-        logging.error(jsonReply)
-        print jsonReply
+    #Candidates come from the local index of the target ontology if it was loaded, otherwise from the OLS search
+    if targetOntology in localIndexes:
+        jsonReply=localIndexes[targetOntology].search(termLabel)
+        termLabel=termLabel.encode(encoding='UTF-8')
+    else:
+        jsonReply=apiCall(url, data)
+        termLabel=termLabel.encode(encoding='UTF-8')
+
+        #WE found at least 1 hit
+        try:
+            jsonReply=jsonReply.json()['response']
+        except:
+            print "Error with deoding jsonReply from OLS api call!"
+            logging.error("Error with deoding jsonReply from OLS api call!")
+            print data
+            print url
+            logging.error(data)
+            logging.error(jsonReply)
+            print jsonReply
 
     if  jsonReply['numFound']>0:
-        levList=[]
+        #Compare the inputLabel with the label and all synonym Labels of every reply, all in one batch.
+        #If lev score is higher for a synonym, replace lev score --> boost synonym label hits
+        answerTerms=[]
+        replyTerms=[]
         for reply in jsonReply['docs']:
             try:
-                answerTerm=reply['label'].encode(encoding='UTF-8')
-                lev=stringMatcher(termLabel, answerTerm, replaceTermList, removeStopwordsList)
-
-                #Compare the inputLabel with all synonym Labels as well.
-                #If lev score is higher for a synonym, replace lev score --> boost synonym label hits
+                tmpTerms=[reply['label'].encode(encoding='UTF-8')]
                 if "synonym" in reply.keys():
                     for synonym in reply["synonym"]:
-                        answerTerm=synonym.encode(encoding='UTF-8')
-                        tmpLev=stringMatcher(termLabel, answerTerm, replaceTermList, removeStopwordsList)
-                        if tmpLev>lev:
-                            lev=tmpLev
+                        tmpTerms.append(synonym.encode(encoding='UTF-8'))
+                replyTerms.append((len(answerTerms), len(tmpTerms), None))
+                answerTerms.extend(tmpTerms)
+            except Exception as e:
+                replyTerms.append((0, 0, e))
 
-                levList.append({"SourceLabel": termLabel, "SourceIRI": termLabel , "TargetIRI": reply['iri'], "TargetLabel": reply['label'], "lev":lev})
+        levScores=stringMatcherBatch(termLabel, answerTerms, replaceTermList, removeStopwordsList)
 
-            except Exception as e:
+        levList=[]
+        for reply, (start, length, e) in zip(jsonReply['docs'], replyTerms):
+            if e==None:
+                lev=max(levScores[start:start+length])
+                levList.append({"SourceLabel": termLabel, "SourceIRI": termLabel , "TargetIRI": reply['iri'], "TargetLabel": reply['label'], "lev":lev})
+            else:
                 print e
                 print "ERROR WITH LEV Distance, score 0 for now for these two"
                 print reply
@@ -166,9 +368,24 @@ def olsFuzzyMatch(termLabel, targetOntology, replaceTermList, removeStopwordsLis
 
     else:
         sortedLev=[{"SourceLabel": termLabel, "SourceIRI": termLabel , "TargetIRI": "UNKNOWN", "TargetLabel": "UNKNOWN", "lev": 0}]
+    return sortedLev
+
+#Now let's relax The fuzzy search and aim for other (all) ontologies, hits in the target ontology are not used as bridge
+def bridgeTerms(termLabel, targetOntology, url):
+    bridgeCandidates=relaxedSearch(termLabel.encode(encoding='UTF-8'), url+"search")
+    oxoTargetList=[]
+    for shortForm, ontologyName in bridgeCandidates:
+        if ontologyName!=targetOntology:
+            oxoTargetList.append({"short_form": shortForm,"bridgeOntology":ontologyName})
+    return oxoTargetList
+
+#Relaxed OLS search of a label in all ontologies, returns the (short_form, ontology_name) of the hits.
+#Answered from the relaxedSearchCache if the label was searched before, failed searches are not cached
+def relaxedSearch(termLabel, url):
+    bridgeCandidates=relaxedSearchCache.get(termLabel)
+    if bridgeCandidates!=None:
+        return bridgeCandidates
 
-
-    ##Now let's relax The fuzzy search and aim for other (all) ontologies
     data={"q":termLabel, "type":"class", "local":True, "limit":5}
     jsonReply=apiCall(url, data)
     try:
@@ -181,25 +398,29 @@ def olsFuzzyMatch(termLabel, targetOntology, replaceTermList, removeStopwordsLis
         logging.error(jsonReply)
         logging.error(data)
         logging.error(e)
+        return ()
 
+    bridgeCandidates=[]
     try:
-        oxoTargetList=[]
         if  jsonReply['numFound']>0:
             for reply in jsonReply['docs']:
-                if reply['ontology_name']!=targetOntology:
-                    oxoTargetList.append({"short_form": reply['short_form'],"bridgeOntology":reply['ontology_name']})
-
-        return {"fuzzyTerms": sortedLev, "bridgeTerms": oxoTargetList}
+                bridgeCandidates.append((reply['short_form'], reply['ontology_name']))
     except Exception as e:
         print "Error processing jsonsReply"
         print jsonReply
         print e
         logging.error(e)
         logging.error(jsonReply)
-        return {"fuzzyTerms": sortedLev, "bridgeTerms": oxoTargetList}
+        return tuple(bridgeCandidates)
+
+    bridgeCandidates=tuple(bridgeCandidates)
+    relaxedSearchCache.put(termLabel, bridgeCandidates)
+    return bridgeCandidates
 
 #Executes the basic calls, delievers primary score (raw scoring)
 def primaryScoreTerm(termIRI, termLabel, targetOntology, scoreParams, urls):
+    if concurrentCalls>0:
+        return primaryScoreTermConcurrent(termIRI, termLabel, targetOntology, scoreParams, urls)
     replaceTermList=scoreParams["replaceTermList"]
     removeStopwordsList=scoreParams["removeStopwordsList"]
 
@@ -208,19 +429,42 @@ def primaryScoreTerm(termIRI, termLabel, targetOntology, scoreParams, urls):
     if termIRI!='':
         oxoResults=oxoMatch(termIRI, targetOntology, urls["oxo"])
     else:
-        #print "nononno you should not be executed"
-        #print termIRI
-        #print termLabel
-        #print targetOntology
         oxoResults=[{"curie":"UNKNOWN", "distance": 0, "oxoLabel":"UNKNOWN"}]
 
-    bridgeTerms=olsFuzzyResult['bridgeTerms']
-    olsFuzzyResult=olsFuzzyResult['fuzzyTerms']
+    bridgeResults=[oxoMatch(bridgeTerm['short_form'],targetOntology, urls["oxo"]) for bridgeTerm in olsFuzzyResult['bridgeTerms']]
+    bridgeOxo=bridgeOxoEvidence(bridgeResults, termIRI, termLabel)
+
+    scoreTerm={"sourceTerm": termLabel, "targetOntology":targetOntology,"olsFuzzyScore":olsFuzzyResult['fuzzyTerms'], "oxoScore":oxoResults, "bridgeEvidence":bridgeOxo}
+    return scoreTerm
+
+#Same result as primaryScoreTerm, but the calls that do not depend on each other run at the same time in the call pool:
+#the fuzzy search, the relaxed search and the Oxo search of the term, then the Oxo searches of all bridge terms
+def primaryScoreTermConcurrent(termIRI, termLabel, targetOntology, scoreParams, urls):
+    replaceTermList=scoreParams["replaceTermList"]
+    removeStopwordsList=scoreParams["removeStopwordsList"]
+    pool=getCallPool()
+
+    oxoResults=None
+    if termIRI!='':
+        oxoResults=pool.apply_async(oxoMatch, (termIRI, targetOntology, urls["oxo"]))
+
+    olsFuzzyResult=olsFuzzyMatchConcurrent(termLabel, targetOntology, replaceTermList, removeStopwordsList, urls["ols"])
+    bridgeResults=pool.map(functools.partial(oxoMatch, targetOntology=targetOntology, url=urls["oxo"]), [bridgeTerm['short_form'] for bridgeTerm in olsFuzzyResult['bridgeTerms']])
+    bridgeOxo=bridgeOxoEvidence(bridgeResults, termIRI, termLabel)
+
+    if oxoResults!=None:
+        oxoResults=oxoResults.get()
+    else:
+        oxoResults=[{"curie":"UNKNOWN", "distance": 0, "oxoLabel":"UNKNOWN"}]
+
+    scoreTerm={"sourceTerm": termLabel, "targetOntology":targetOntology,"olsFuzzyScore":olsFuzzyResult['fuzzyTerms'], "oxoScore":oxoResults, "bridgeEvidence":bridgeOxo}
+    return scoreTerm
 
+#Combines the Oxo search results of the bridge terms (in the order of the relaxed search) to the bridge evidence of a term
+def bridgeOxoEvidence(bridgeResults, termIRI, termLabel):
     bridgeOxo=[]
-    if len(bridgeTerms)>0:
-        for bridgeTerm in bridgeTerms:
-            tmp=oxoMatch(bridgeTerm['short_form'],targetOntology, urls["oxo"])
+    if len(bridgeResults)>0:
+        for tmp in bridgeResults:
             for line in tmp:
                 if line['curie']!='UNKNOWN':
                     bridgeOxo.append(tmp)
@@ -238,9 +482,7 @@ def primaryScoreTerm(termIRI, termLabel, targetOntology, scoreParams, urls):
         print termLabel
         print bridgeOxo
         bridgeOxo=[[{"curie":"UNKNOWN", "distance": 0}]]
-
-    scoreTerm={"sourceTerm": termLabel, "targetOntology":targetOntology,"olsFuzzyScore":olsFuzzyResult, "oxoScore":oxoResults, "bridgeEvidence":bridgeOxo}
-    return scoreTerm
+    return bridgeOxo
 
 #The fuction takes a primary score (raw) and calculates a corresponding score for each subresult
 def processPScore(pScore):
@@ -329,6 +571,66 @@ def simplifyProcessedPscore(mapping):
 
     return scoreMatrix
 
+#Hashable form of a simplified score, equal simplified scores have equal keys
+def simplifiedPscoreKey(pScore):
+    return tuple(tuple(sorted(obj.items())) for obj in pScore)
+
+#Calls simplifyProcessedPscore for every row of the primary score (sourceLabel, sourceIRI, fuzzy, oxo, synFuzzy, bridgeEvidence).
+#The result only depends on the source row, so it is computed once per row and not once per candidate.
+#Rows without any candidate are skipped, duplicates are removed in the order of their first appearance
+def simplifyPrimaryScoreRows(rows):
+    simplerMatrix=[]
+    seen=set()
+    for originalLabel, orginaliri, fuzzy, oxo, synFuzzy, bridgeEvidence in rows:
+        if len(fuzzy)==0 and len(oxo)==0 and len(synFuzzy)==0 and len(bridgeEvidence)==0:
+            continue
+        obj={"sourceTerm":originalLabel, "sourceIRI":orginaliri, "olsFuzzyScore": fuzzy, "oxoScore": oxo, "synFuzzy": synFuzzy, "bridgeEvidence":bridgeEvidence}
+        pScore=simplifyProcessedPscore(obj)
+        key=simplifiedPscoreKey(pScore)
+        if key not in seen:
+            seen.add(key)
+            simplerMatrix.append(pScore)
+    return simplerMatrix
+
+#Policies of uniqueMappings and the column of a predicted mapping (sourceIRI, mappedIRI, score, ...) that has to be unique:
+#target keeps one mapping per target IRI, source one per source IRI and both one mapping per source and per target IRI
+uniqueMapsColumns={"target": 1, "source": 0}
+uniqueMapsPolicies=["target", "source", "both"]
+
+#Makes the predicted mappings unique. With the policy target or source the best scored mapping per IRI is kept in one
+#pass, at the position of the first mapping of that IRI; on equal scores the first one is kept
+def uniqueMappings(predictedMappings, policy="target"):
+    if policy=="both":
+        return oneToOneMappings(predictedMappings)
+    column=uniqueMapsColumns[policy]
+    positions={}
+    unified=[]
+    for line in predictedMappings:
+        index=positions.get(line[column])
+        if index==None:
+            positions[line[column]]=len(unified)
+            unified.append(line)
+        #Found higher score, so replace the lower!
+        elif unified[index][2]<line[2]:
+            unified[index]=line
+    return unified
+
+#One-to-one mappings: the mappings are taken from the best score down, a mapping is kept if neither its source nor its
+#target IRI has a mapping yet. On equal scores the mapping that comes first wins, the kept mappings stay in input order
+def oneToOneMappings(predictedMappings):
+    predictedMappings=list(predictedMappings)
+    order=sorted(range(len(predictedMappings)), key=lambda index:predictedMappings[index][2], reverse=True)
+    sources=set()
+    targets=set()
+    kept=[]
+    for index in order:
+        line=predictedMappings[index]
+        if line[0] not in sources and line[1] not in targets:
+            sources.add(line[0])
+            targets.add(line[1])
+            kept.append(index)
+    return [predictedMappings[index] for index in sorted(kept)]
+
 #Simple Score mechanism for all subscores, returns a sorted list. Is Called after simplifyProcessedPscore
 def scoreSimple(scoreMatrix, params):
     threshold=params['threshold']
@@ -349,6 +651,8 @@ def scoreSimple(scoreMatrix, params):
 
     resultMatrix=[]
     for i,score in enumerate(scoreMatrix):
+        #Work on a copy, the rows of the caller keep their raw distances
+        score=dict(score)
         fFactor=0
         if score['fuzzyScore']==1:  #Exact match, we shall boost this by all means, so we take UpperFactor*2 for now
             fFactor=3*fuzzyUpperFactor
@@ -388,7 +692,7 @@ def scoreSimple(scoreMatrix, params):
 
         ### Do we want unknown to be printed
         if score['finaleScore']>threshold:          #This removes "unknow" from the results and weak results
-            resultMatrix.append(scoreMatrix[i])
+            resultMatrix.append(score)
 
     #Sort the thing so the best score is top
     resultMatrix=sorted(resultMatrix, key=lambda resultMatrix:resultMatrix['finaleScore'], reverse=True)
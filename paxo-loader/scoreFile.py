@@ -0,0 +1,167 @@
+import struct
+import zlib
+
+#Binary file for the primary scores of paxo -s, read back by -c and -cv instead of parsing the scoring csv.
+#The file is a header followed by chunks, one per OLS page, so it can be appended to and truncated at a chunk border.
+#A chunk is zlib compressed and holds a string table (labels and IRIs, flagged as str, unicode or None) followed by the struct packed rows:
+#  row:    labelIdx, iriIdx, number of fuzzy, oxo, synFuzzy and bridge entries
+#  fuzzy:  fuzzyMapping, fuzzyIri, isFloat, fuzzyScore       (same for synFuzzy)
+#  oxo:    oxoCurie, distance, oxoLabel, oxoScore
+#  bridge: oxoCurie, distance, oxoScore
+MAGIC=b"PAXOSCORE1\n"
+
+chunkHeader=struct.Struct('<I')
+countStruct=struct.Struct('<I')
+stringStruct=struct.Struct('<IB')
+rowStruct=struct.Struct('<6I')
+fuzzyStruct=struct.Struct('<IIBd')
+oxoStruct=struct.Struct('<IiIi')
+bridgeStruct=struct.Struct('<Iii')
+
+#Kind of an entry of the string table
+STR=0
+UNICODE=1
+NONE=2
+
+def kindOf(value):
+    if value==None:
+        return NONE
+    if isinstance(value, unicode):
+        return UNICODE
+    return STR
+
+class StringTable:
+    def __init__(self):
+        self.index={}
+        self.strings=[]
+
+    #Strings, unicode strings and None (e.g. an Oxo term without label) get their own entries, so the rows are read back
+    #with the same types
+    def add(self, value):
+        key=(value, kindOf(value))
+        position=self.index.get(key)
+        if position==None:
+            position=len(self.strings)
+            self.index[key]=position
+            self.strings.append(key)
+        return position
+
+def packChunk(rows):
+    table=StringTable()
+    parts=[]
+    for row in rows:
+        label, iri, fuzzy, oxo, synFuzzy, bridge=row
+        parts.append(rowStruct.pack(table.add(label), table.add(iri), len(fuzzy), len(oxo), len(synFuzzy), len(bridge)))
+        for entry in fuzzy:
+            parts.append(packFuzzy(table, entry))
+        for entry in oxo:
+            parts.append(oxoStruct.pack(table.add(entry['oxoCurie']), int(entry['distance']), table.add(entry['oxoLabel']), entry['oxoScore']))
+        for entry in synFuzzy:
+            parts.append(packFuzzy(table, entry))
+        for entry in bridge:
+            parts.append(bridgeStruct.pack(table.add(entry['oxoCurie']), int(entry['distance']), entry['oxoScore']))
+
+    header=[countStruct.pack(len(table.strings))]
+    for value, kind in table.strings:
+        if kind==UNICODE:
+            value=value.encode('utf-8')
+        elif kind==NONE:
+            value=b''
+        header.append(stringStruct.pack(len(value), kind))
+        header.append(value)
+    header.append(countStruct.pack(len(rows)))
+    return zlib.compress(b''.join(header+parts))
+
+#The score is 0 (int) for unknown terms and a float otherwise, the type is kept so the read back rows are the same
+def packFuzzy(table, entry):
+    score=entry['fuzzyScore']
+    return fuzzyStruct.pack(table.add(entry['fuzzyMapping']), table.add(entry['fuzzyIri']), isinstance(score, float), score)
+
+def unpackChunk(payload):
+    data=zlib.decompress(payload)
+    offset=0
+    count=countStruct.unpack_from(data, offset)[0]
+    offset=offset+countStruct.size
+    texts=[]
+    for i in range(count):
+        length, kind=stringStruct.unpack_from(data, offset)
+        offset=offset+stringStruct.size
+        value=data[offset:offset+length]
+        if kind==UNICODE:
+            value=value.decode('utf-8')
+        elif kind==NONE:
+            value=None
+        texts.append(value)
+        offset=offset+length
+
+    numberOfRows=countStruct.unpack_from(data, offset)[0]
+    offset=offset+countStruct.size
+    rows=[]
+    for i in range(numberOfRows):
+        labelIdx, iriIdx, nFuzzy, nOxo, nSynFuzzy, nBridge=rowStruct.unpack_from(data, offset)
+        offset=offset+rowStruct.size
+        fuzzy, offset=unpackFuzzy(data, offset, nFuzzy, texts)
+        oxo=[]
+        for j in range(nOxo):
+            curie, distance, label, score=oxoStruct.unpack_from(data, offset)
+            offset=offset+oxoStruct.size
+            oxo.append({'oxoCurie': texts[curie], 'distance': distance, 'oxoLabel': texts[label], 'oxoScore': score})
+        synFuzzy, offset=unpackFuzzy(data, offset, nSynFuzzy, texts)
+        bridge=[]
+        for j in range(nBridge):
+            curie, distance, score=bridgeStruct.unpack_from(data, offset)
+            offset=offset+bridgeStruct.size
+            bridge.append({'oxoCurie': texts[curie], 'distance': distance, 'oxoScore': score})
+        rows.append((texts[labelIdx], texts[iriIdx], fuzzy, oxo, synFuzzy, bridge))
+    return rows
+
+def unpackFuzzy(data, offset, count, texts):
+    entries=[]
+    for j in range(count):
+        mapping, iri, isFloat, score=fuzzyStruct.unpack_from(data, offset)
+        offset=offset+fuzzyStruct.size
+        if not isFloat:
+            score=int(score)
+        entries.append({'fuzzyMapping': texts[mapping], 'fuzzyIri': texts[iri], 'fuzzyScore': score})
+    return entries, offset
+
+#Appends chunks to a new file, or to an existing one from the given offset (after a checkpoint)
+class ScoreFileWriter:
+    def __init__(self, path, offset=None):
+        if offset==None:
+            self.f=open(path, 'wb')
+            self.f.write(MAGIC)
+        else:
+            self.f=open(path, 'r+b')
+            self.f.truncate(offset)
+            self.f.seek(offset)
+
+    def writeChunk(self, rows):
+        payload=packChunk(rows)
+        self.f.write(chunkHeader.pack(len(payload)))
+        self.f.write(payload)
+
+    def tell(self):
+        return self.f.tell()
+
+    def flush(self):
+        self.f.flush()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+#Yields the rows of a score file as (sourceLabel, sourceIRI, fuzzy, oxo, synFuzzy, bridgeEvidence)
+def readScoreFile(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC))!=MAGIC:
+            raise Exception(path+" is not a paxo score file")
+        while True:
+            header=f.read(chunkHeader.size)
+            if len(header)<chunkHeader.size:
+                break
+            length=chunkHeader.unpack(header)[0]
+            for row in unpackChunk(f.read(length)):
+                yield row
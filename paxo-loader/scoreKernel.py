@@ -0,0 +1,73 @@
+import numpy
+
+#Columnar form of the simplified primary score (see paxo_internals.simplifyPrimaryScoreRows). One entry per candidate,
+#built once and scored with any number of parameter sets without changing the candidates
+class ScoreColumns:
+    def __init__(self, simplerMatrix):
+        self.candidates=[]
+        sourceIds=[]
+        for sourceId, line in enumerate(simplerMatrix):
+            for score in line:
+                self.candidates.append(score)
+                sourceIds.append(sourceId)
+
+        self.source=numpy.array(sourceIds, dtype=numpy.int64)
+        #Position of the candidate, decides between equal scores like the stable sorts of scoreSimple
+        self.position=numpy.arange(len(self.candidates), dtype=numpy.int64)
+        self.fuzzy=numpy.array([score['fuzzyScore'] for score in self.candidates], dtype=numpy.float64)
+        self.synFuzzy=numpy.array([score['synFuzzy'] for score in self.candidates], dtype=numpy.float64)
+        self.oxo=numpy.array([score['oxoScore'] for score in self.candidates], dtype=numpy.float64)
+        self.bridge=numpy.array([score['bridgeOxoScore'] for score in self.candidates], dtype=numpy.float64)
+
+#Oxo distances are replaced one after the other, the same way scoreSimple does it
+def distanceWeights(distance, params):
+    distance=numpy.where(distance==1, params['oxoDistanceOne'], distance)
+    distance=numpy.where(distance==2, params['oxoDistanceTwo'], distance)
+    distance=numpy.where(distance==3, params['oxoDistanceThree'], distance)
+    return distance
+
+#Same score as paxo_internals.scoreSimple, computed for all candidates at once
+def finaleScores(columns, params):
+    fuzzyUpperLimit=params['fuzzyUpperLimit']
+    fuzzyLowerLimit=params['fuzzyLowerLimit']
+    fuzzyUpperFactor=params['fuzzyUpperFactor']
+    fuzzyLowerFactor=params['fuzzyLowerFactor']
+
+    fuzzy=columns.fuzzy
+    fFactor=numpy.select([fuzzy==1, fuzzy>=fuzzyUpperLimit, (fuzzy<fuzzyUpperLimit) & (fuzzy>=fuzzyLowerLimit)],
+                         [3*fuzzyUpperFactor, fuzzyUpperFactor, fuzzyLowerFactor], 0)
+    #Like scoreSimple, the lower synonym factor depends on the fuzzy score of the label
+    synFuzzy=columns.synFuzzy
+    synFuzzyFactor=numpy.select([synFuzzy==1, synFuzzy>=fuzzyUpperLimit, (synFuzzy<fuzzyUpperLimit) & (fuzzy>=fuzzyLowerLimit)],
+                                [2*fuzzyUpperFactor, fuzzyUpperFactor, fuzzyLowerFactor], 0)
+
+    oxo=distanceWeights(columns.oxo, params)
+    bridge=distanceWeights(columns.bridge, params)
+    finaleScore=fuzzy*fFactor+oxo+synFuzzy*synFuzzyFactor+bridge*params['bridgeOxoFactor']
+    return finaleScore, oxo, bridge
+
+#Scores all candidates and returns the best candidate above the threshold of every source term, best scored source terms first.
+#Every entry is a list holding a copy of the candidate with the finaleScore, like the first entry of the result of scoreSimple
+def scoreColumns(columns, params):
+    if len(columns.candidates)==0:
+        return []
+    finaleScore, oxo, bridge=finaleScores(columns, params)
+
+    kept=numpy.nonzero(finaleScore>params['threshold'])[0]
+    #Per source the highest score, the first candidate wins a tie
+    order=kept[numpy.lexsort((columns.position[kept], -finaleScore[kept], columns.source[kept]))]
+    sources=columns.source[order]
+    first=numpy.ones(len(order), dtype=bool)
+    first[1:]=sources[1:]!=sources[:-1]
+    best=order[first]
+    #Best scored source terms first, the earlier source term wins a tie
+    best=best[numpy.lexsort((columns.source[best], -finaleScore[best]))]
+
+    result=[]
+    for i in best:
+        score=dict(columns.candidates[i])
+        score['oxoScore']=oxo[i].item()
+        score['bridgeOxoScore']=bridge[i].item()
+        score['finaleScore']=finaleScore[i].item()
+        result.append([score])
+    return result
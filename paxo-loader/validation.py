@@ -1,20 +1,61 @@
 import csv
 import logging
-import requests
 import time
+from collections import Counter
+
+#Compares the computed mappings (sourceIRI, targetIRI, score, labels) with the (uri1, uri2) pairs and the rows of a standard.
+#Returns the matches, the mappings of the standard that were missed, the computed mappings that are not in the standard (alternatives)
+#and the number of (alternative, miss) pairs that share exactly one of the two IRIs
+def compareWithStandard(inputLongList, targetList, targetLongList, counterPosition):
+    inputPairs=set()
+    #Score of the last computed mapping for a pair of IRIs and for a target IRI
+    pairScore={}
+    targetScore={}
+    for c in inputLongList:
+        inputPairs.add((c[0], c[1]))
+        pairScore[(c[0], c[1])]=c[2]
+        targetScore[c[1]]=c[2]
+
+    targetPairs=set(targetList)
+    missing=[]
+    matches=[]
+    #Now validate the computed mappings against the standard
+    for counter, line in enumerate(targetList):
+        row=targetLongList[counter]
+        if line not in inputPairs:
+            missing.append([line[0], line[1], "NoScore", row[counterPosition], row[1], row[3]])
+
+        #Exact same Result for both, so this is a match. Is added to the matches List
+        else:
+            #Computed mappings of the same source and target IRI count as a match for any source IRI, the last one wins
+            if line[0]==line[1]:
+                score=targetScore[line[1]]
+            else:
+                score=pairScore[line]
+            matches.append([line[0], line[1], score, row[counterPosition], row[1], row[3]])
 
-def validateFinaleScore(onto1, onto2, stdNamed, inputFile, TargetFile, writeToDisc, params, parseParms, validationTargetFolder, url):
+    #Add those mappings that where no in the standard but calculated to the alternatives List
+    alternatives=[]
+    for c in inputLongList:
+        if (c[0], c[1]) not in targetPairs and c[1]!="UNKNOWN":
+            alternatives.append([c[0], c[1], c[2], "noScore", c[3], c[4]])
+
+    #Alternative Counter, an alternative and a miss overlap if they share the source or the target IRI but not both
+    missSource=Counter(miss[0] for miss in missing)
+    missTarget=Counter(miss[1] for miss in missing)
+    missPair=Counter((miss[0], miss[1]) for miss in missing)
+    alternativeCounter=0
+    for sug in alternatives:
+        alternativeCounter=alternativeCounter+missSource[sug[0]]+missTarget[sug[1]]-2*missPair[(sug[0], sug[1])]
+
+    return matches, missing, alternatives, alternativeCounter
+
+#Reads a standard file, returns the (uri1, uri2) pairs and the full rows
+def readStandard(TargetFile, parseParms):
     uri1Position=parseParms['uri1']
     uri2Position=parseParms['uri2']
-    counterPosition=parseParms['scorePosition']
     delimiterChar=parseParms['delimiter']
 
-    inputList=[]
-    inputLongList=[]
-    for row in inputFile:
-        inputList.append([row[0], row[1]])
-        inputLongList.append(row)
-
     targetList=[]
     targetLongList=[]
     with open(TargetFile) as csvfile:
@@ -23,51 +64,25 @@ def validateFinaleScore(onto1, onto2, stdNamed, inputFile, TargetFile, writeToDi
         next(readCSV)
         try:
             for row in readCSV:
-                targetList.append([row[uri1Position], row[uri2Position]])
+                targetList.append((row[uri1Position], row[uri2Position]))
                 targetLongList.append(row)
         except Exception as e:
             print "Error while reading in target file"
             print row
             raise e
 
-    missing=[]
-    matches=[]
-
-    #Now validate the computed mappings against the standard
-    for counter, line in enumerate(targetList):
-
-            if line not in inputList:
-                missing.append([line[0], line[1], "NoScore", targetLongList[counter][counterPosition], targetLongList[counter][1], targetLongList[counter][3]])
+    return targetList, targetLongList
 
-            #Exact same Result for both, so this is a match. Is added to the matches List
-            else:
-                for c in inputLongList:
-                    if c[0]==line[0] and c[1]==line[1] or c[1]==line[0] and c[1]==line[1]:
-                        score=c[2]
-
-                matches.append([line[0], line[1], score, targetLongList[counter][counterPosition],targetLongList[counter][1], targetLongList[counter][3]])
-            #Add those mappings that where no in the standard but calculated to the alternatives List
-
-    alternatives=[]
-    for counter, line in enumerate(inputList):
-        if line not in targetList and line[1]!="UNKNOWN":
-            alternatives.append([line[0], line[1], inputLongList[counter][2], "noScore", inputLongList[counter][3], inputLongList[counter][4]])
+def validateFinaleScore(onto1, onto2, stdNamed, inputFile, TargetFile, writeToDisc, params, parseParms, validationTargetFolder, url):
+    counterPosition=parseParms['scorePosition']
 
+    inputLongList=[]
+    for row in inputFile:
+        inputLongList.append(row)
 
-    #Alternative Counter
-    alternativeCounter=0
-    unrealMiss=[]
-    realMiss=[]
-    for sug in alternatives:
-        for miss in missing:
-            if (sug[0]==miss[0] and sug[1]!=miss[1]) or (sug[0]!=miss[0] and sug[1]==miss[1]):
-                alternativeCounter=alternativeCounter+1
-                unrealMiss.append(sug)
-                unrealMiss.append(miss)
-            #Real miss
-            else:
-                realMiss.append(miss)
+    targetList, targetLongList=readStandard(TargetFile, parseParms)
 
+    matches, missing, alternatives, alternativeCounter=compareWithStandard(inputLongList, targetList, targetLongList, counterPosition)
 
     result=matches+missing+alternatives#+discarted - we can also show the discarted terms or put them in an own file
 